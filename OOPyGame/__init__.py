@@ -7,12 +7,20 @@
         User interface helpers
 <================"""
 import time
+import queue
+import threading
+import weakref
+import multiprocessing
+from multiprocessing import shared_memory
 import pygame
 import cssutils
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from FaceAnalyzer.helpers.geometry.euclidian import is_point_inside_rect
 from FaceAnalyzer.helpers.ui.pygame.colors import get_color
+from OOPyGame.sources import FrameSource, IteratorSource, RawVideoSource, DirectorySource, SharedMemoryRing, SharedMemorySource
 # Widgets
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from urllib.request import urlopen
 
 import numpy as np
@@ -40,8 +48,13 @@ class WidgetStyle:
         width: The width of the widget.
         height: The height of the widget.
         align: The alignment of the text.
-        img: The image to use for the widget.   
-  
+        wrap: If True, the text is word wrapped to the width of the widget.
+        overflow: What to do with text that does not fit, 'visible', 'clip' or 'ellipsis'.
+        text_rendering: 'cache' to cache whole rendered lines, 'atlas' to draw glyphs from an atlas (for text changing often).
+        img: The image to use for the widget.
+        img_slice: The (top, right, bottom, left) nine-slice insets of the image (pixels or 'n%' strings), None to stretch the whole image.
+        img_repeat: How the nine-slice edges and center fill the widget, 'stretch' or 'repeat'.
+
     """
     font : pygame.font.Font = pygame.font.Font('freesansbold.ttf', 14)
     bg_color: tuple = (100,100,100)
@@ -56,12 +69,812 @@ class WidgetStyle:
     width: int = None
     height: int = None
     align:str = 'center'
+    wrap:bool = False
+    overflow:str = 'visible'
+    text_rendering:str = 'cache'
     img:str = None
+    img_slice:tuple = None
+    img_repeat:str = 'stretch'
+
+# =============================================== Surface cache ==========================================
+
+class LRUCache():
+    def __init__(self, max_entries:int=512):
+        """Builds a thread safe least recently used cache of any values (layouts, arrays, atlases...)
+
+        Args:
+            max_entries (int, optional): The maximum number of values to keep. Defaults to 512.
+        """
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        # Widgets may be painted from several threads (see WindowManager.setRenderThreads)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the value cached under key or None if it is not cached
+        """
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        """Stores a value and evicts the least recently used ones when the cache is full
+        """
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries)>self.max_entries:
+                self.entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+class SurfaceCache(LRUCache):
+    def __init__(self, max_entries:int=512, max_pixels:int=None):
+        """Builds a least recently used cache of pre-rendered surfaces, limited in count and optionally in pixels
+
+        Args:
+            max_entries (int, optional): The maximum number of surfaces to keep. Defaults to 512.
+            max_pixels (int, optional): The maximum total number of pixels of the kept surfaces. Defaults to None (no limit).
+        """
+        LRUCache.__init__(self, max_entries)
+        self.max_pixels = max_pixels
+        self.pixels = 0
+
+    def put(self, key, surface:pygame.Surface):
+        """Stores a surface and evicts the least recently used ones when the cache is full
+        """
+        with self.lock:
+            if self.max_pixels is not None:
+                previous = self.entries.get(key)
+                if previous is not None:
+                    self.pixels -= previous.get_width()*previous.get_height()
+                self.pixels += surface.get_width()*surface.get_height()
+            self.entries[key] = surface
+            self.entries.move_to_end(key)
+            while len(self.entries)>self.max_entries or (self.max_pixels is not None and self.pixels>self.max_pixels and len(self.entries)>1):
+                _, evicted = self.entries.popitem(last=False)
+                if self.max_pixels is not None:
+                    self.pixels -= evicted.get_width()*evicted.get_height()
+        return surface
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.pixels = 0
+
+# Pre-rendered backgrounds and borders shared by all widgets
+rect_cache = SurfaceCache()
+# Background images composed at the size of the widgets using them
+image_cache = SurfaceCache(128)
+
+# =============================================== Display format ==========================================
+
+# Surfaces owned by OOPyGame that are kept in the display pixel format : id(owner) -> (weak owner, attributes)
+_display_surfaces = {}
+# The (bitsize, masks) of the display the surfaces were last converted to
+_display_format = None
+
+def to_display_format(surface:pygame.Surface):
+    """Converts a surface to the pixel format of the display so that blitting it needs no per pixel conversion.
+    Surfaces with per pixel alpha keep it. If there is no display yet, the surface is returned as is.
+
+    Args:
+        surface (pygame.Surface): The surface to convert
+
+    Returns:
+        pygame.Surface: The converted surface
+    """
+    if surface is None or pygame.display.get_surface() is None:
+        return surface
+    if surface.get_flags() & pygame.SRCALPHA:
+        return surface.convert_alpha()
+    return surface.convert()
+
+def register_display_surface(owner, attribute:str):
+    """Keeps owner.attribute in the display pixel format.
+    It is converted right away if the display exists, otherwise when the display is created,
+    and again each time the display pixel format changes.
+
+    Args:
+        owner (object): The object holding the surface (it is only weakly referenced)
+        attribute (str): The name of the attribute holding the surface
+    """
+    key = id(owner)
+    if key not in _display_surfaces:
+        _display_surfaces[key] = (weakref.ref(owner, lambda _, key=key: _display_surfaces.pop(key, None)), set())
+    _display_surfaces[key][1].add(attribute)
+    setattr(owner, attribute, to_display_format(getattr(owner, attribute)))
+
+def convert_display_surfaces(force:bool=False)->bool:
+    """Converts all registered surfaces if the display pixel format changed since the last call
+
+    Args:
+        force (bool, optional): Convert even if the format did not change. Defaults to False.
+
+    Returns:
+        bool: True if the surfaces were converted
+    """
+    global _display_format
+    display = pygame.display.get_surface()
+    if display is None:
+        return False
+    display_format = (display.get_bitsize(), display.get_masks())
+    if display_format == _display_format and not force:
+        return False
+    _display_format = display_format
+    for owner_ref, attributes in list(_display_surfaces.values()):
+        owner = owner_ref()
+        if owner is None:
+            continue
+        for attribute in attributes:
+            setattr(owner, attribute, to_display_format(getattr(owner, attribute)))
+    # Cached renders were made in the old format
+    rect_cache.clear()
+    image_cache.clear()
+    text_layout.lines.clear()
+    atlas_cache.clear()
+    return True
+
+def render_rect(size:tuple, bg_color:tuple, border_color:tuple, border_size:int, border_radius:float):
+    """Renders a background and its border into a new transparent surface
+
+    Args:
+        size (tuple): The (width, height) of the surface
+        bg_color (tuple): The background color or None for no background
+        border_color (tuple): The border color
+        border_size (int): The border size, 0 for no border
+        border_radius (float): The corners radius
+
+    Returns:
+        pygame.Surface: The rendered surface
+    """
+    surface = pygame.Surface(size, pygame.SRCALPHA)
+    rect = [0, 0, size[0], size[1]]
+    if bg_color is not None:
+        pygame.draw.rect(surface, bg_color, rect, border_radius = int(border_radius))
+    if border_size>0:
+        pygame.draw.rect(surface, border_color, rect, border_size, border_radius = int(border_radius))
+    return to_display_format(surface)
+
+def render_nine_slice(img:pygame.Surface, size:tuple, img_slice:tuple, img_repeat:str='stretch'):
+    """Composes an image at a given size using border-image like nine-slice scaling.
+    Corners are copied as they are, edges and center are stretched or tiled from
+    subsurfaces of the source image so no full size scaled copy of the image is ever made.
+
+    Args:
+        img (pygame.Surface): The source image
+        size (tuple): The (width, height) of the resulting surface
+        img_slice (tuple): The (top, right, bottom, left) insets of the corners, in pixels or 'n%' of the image size
+        img_repeat (str, optional): 'stretch' or 'repeat'. Defaults to 'stretch'.
+
+    Returns:
+        pygame.Surface: The composed surface
+    """
+    w, h = size
+    iw, ih = img.get_size()
+    top, right, bottom, left = [
+                                    int(float(inset[:-1])*extent/100) if isinstance(inset, str) else inset
+                                    for inset, extent in zip(img_slice, (ih, iw, ih, iw))
+                                ]
+    if left+right>min(w, iw) or top+bottom>min(h, ih):
+        # The corners do not fit, fall back to plain stretching
+        return pygame.transform.scale(img, size)
+    surface = pygame.Surface(size, img.get_flags() & pygame.SRCALPHA, img)
+    src_x = (0, left, iw-right, iw)
+    src_y = (0, top, ih-bottom, ih)
+    dst_x = (0, left, w-right, w)
+    dst_y = (0, top, h-bottom, h)
+    for j in range(3):
+        for i in range(3):
+            src = pygame.Rect(src_x[i], src_y[j], src_x[i+1]-src_x[i], src_y[j+1]-src_y[j])
+            dst = pygame.Rect(dst_x[i], dst_y[j], dst_x[i+1]-dst_x[i], dst_y[j+1]-dst_y[j])
+            if src.w<=0 or src.h<=0 or dst.w<=0 or dst.h<=0:
+                continue
+            piece = img.subsurface(src)
+            if src.size == dst.size:
+                surface.blit(piece, dst)
+            elif img_repeat == 'repeat':
+                surface.set_clip(dst)
+                surface.blits([
+                                (piece, (x, y))
+                                for y in range(dst.y, dst.bottom, src.h)
+                                for x in range(dst.x, dst.right, src.w)
+                            ], False)
+                surface.set_clip(None)
+            else:
+                surface.blit(pygame.transform.scale(piece, dst.size), dst)
+    return surface
+
+# =============================================== Text layout ==========================================
+
+# Fonts are not thread safe, measuring and rasterizing text goes through this lock
+font_lock = threading.RLock()
+
+class TextLayout():
+    def __init__(self, max_layouts:int=1024, max_lines:int=2048):
+        """Builds a text layout engine.
+        Line breaking results are cached by (text, font, width) and rendered lines by (line, font, color),
+        so a text is only measured and rendered again when it or the available width changes.
+
+        Args:
+            max_layouts (int, optional): The maximum number of line breaking results to keep. Defaults to 1024.
+            max_lines (int, optional): The maximum number of rendered lines to keep. Defaults to 2048.
+        """
+        self.layouts = LRUCache(max_layouts)
+        self.lines = SurfaceCache(max_lines)
+
+    def layout(self, text:str, font:pygame.font.Font, width:int, wrap:bool=False, overflow:str='visible', max_lines:int=None):
+        """Breaks a text into lines
+
+        Args:
+            text (str): The text to break
+            font (pygame.font.Font): The font used to measure the text
+            width (int): The available width
+            wrap (bool, optional): Word wrap the text to the width. Defaults to False.
+            overflow (str, optional): 'visible', 'clip' or 'ellipsis'. Defaults to 'visible'.
+            max_lines (int, optional): The maximum number of lines, the last one gets an ellipsis if needed. Defaults to None.
+
+        Returns:
+            tuple: The lines
+        """
+        if not wrap and overflow != 'ellipsis':
+            # The width does not change anything, do not let it split the cache
+            width = None
+            max_lines = None
+        key = (text, font, width, wrap, overflow, max_lines)
+        lines = self.layouts.get(key)
+        if lines is None:
+            with font_lock:
+                if wrap:
+                    lines = []
+                    for paragraph in text.split("\n"):
+                        lines += self.wrap(paragraph, font, width)
+                else:
+                    lines = text.split("\n")
+                if max_lines is not None and len(lines)>max_lines:
+                    lines = lines[:max_lines]
+                    lines[-1] = self.ellipsis(lines[-1]+"...", font, width)
+                elif overflow == 'ellipsis':
+                    lines = [self.ellipsis(line, font, width) for line in lines]
+                lines = self.layouts.put(key, tuple(lines))
+        return lines
+
+    def wrap(self, text:str, font:pygame.font.Font, width:int):
+        """Greedily breaks a paragraph at spaces, words wider than width are broken at characters
+        """
+        lines = []
+        line = ""
+        for word in text.split(" "):
+            candidate = word if line == "" else line+" "+word
+            if font.size(candidate)[0]<=width:
+                line = candidate
+                continue
+            if line != "":
+                lines.append(line)
+            line = word
+            while len(line)>1 and font.size(line)[0]>width:
+                n = self.fit(line, font, width)
+                lines.append(line[:n])
+                line = line[n:]
+        lines.append(line)
+        return lines
+
+    def fit(self, text:str, font:pygame.font.Font, width:int):
+        """Returns the number of leading characters of text fitting in width (at least one)
+        """
+        lo, hi = 1, len(text)
+        while lo<hi:
+            mid = (lo+hi+1)//2
+            if font.size(text[:mid])[0]<=width:
+                lo = mid
+            else:
+                hi = mid-1
+        return lo
+
+    def ellipsis(self, text:str, font:pygame.font.Font, width:int):
+        """Truncates text and ends it with ... so that it fits in width
+        """
+        if font.size(text)[0]<=width:
+            return text
+        if text.endswith("..."):
+            text = text[:-3]
+        if font.size("...")[0]>width:
+            return ""
+        lo, hi = 0, len(text)
+        while lo<hi:
+            mid = (lo+hi+1)//2
+            if font.size(text[:mid].rstrip()+"...")[0]<=width:
+                lo = mid
+            else:
+                hi = mid-1
+        return text[:lo].rstrip()+"..."
+
+    def render(self, line:str, font:pygame.font.Font, color:tuple):
+        """Renders a single line, or returns it from the cache
+        """
+        key = (line, font, color)
+        surface = self.lines.get(key)
+        if surface is None:
+            with font_lock:
+                surface = font.render(line, True, color)
+            surface = self.lines.put(key, to_display_format(surface))
+        return surface
+
+    def clear(self):
+        self.layouts.clear()
+        self.lines.clear()
+
+# Text layout engine shared by all widgets
+text_layout = TextLayout()
+
+# =============================================== Glyph atlas ==========================================
+
+class GlyphAtlas():
+    # Glyphs rasterized up front, others are added the first time they are drawn
+    default_charset = "".join(chr(c) for c in range(32, 127))
+
+    def __init__(self, font:pygame.font.Font, color:tuple, charset:str=None):
+        """Builds an atlas holding all glyphs of a font in a given color in a single surface.
+        Strings are then drawn with one batched blits call of glyph sub-rectangles instead of
+        a font.render call per string, which pays off for texts changing every frame.
+        Kerning is ignored, glyphs are placed using their advance.
+
+        Args:
+            font (pygame.font.Font): The font to rasterize
+            color (tuple): The color of the glyphs
+            charset (str, optional): The characters to rasterize up front. Defaults to the printable ascii characters.
+        """
+        self.font = font
+        self.color = color
+        self.glyphs = {}
+        self.build(GlyphAtlas.default_charset if charset is None else charset)
+
+    def build(self, charset:str):
+        """(Re)builds the atlas surface with the given characters
+        """
+        renders = [(c, self.font.render(c, True, self.color)) for c in charset]
+        height = max([self.font.get_height()]+[render.get_height() for _, render in renders])
+        atlas = pygame.Surface((max(1, sum(render.get_width() for _, render in renders)), height), pygame.SRCALPHA)
+        glyphs = {}
+        x = 0
+        for c, render in renders:
+            # The atlas is fully transparent, max blending copies the glyph as is
+            atlas.blit(render, (x, 0), special_flags=pygame.BLEND_RGBA_MAX)
+            metrics = self.font.metrics(c)[0]
+            advance = metrics[4] if metrics is not None else render.get_width()
+            glyphs[c] = (pygame.Rect(x, 0, render.get_width(), render.get_height()), advance)
+            x += render.get_width()
+        self.glyphs = glyphs
+        self.surface = to_display_format(atlas)
+
+    def ensure(self, text:str):
+        """Adds the characters of text missing from the atlas
+        """
+        missing = set(text).difference(self.glyphs)
+        if len(missing)>0:
+            with font_lock:
+                # Glyphs keep their place so that concurrent draws stay valid
+                self.build("".join(self.glyphs)+"".join(sorted(missing)))
+
+    def size(self, text:str):
+        """Returns the width of text drawn with this atlas
+        """
+        self.ensure(text)
+        glyphs = self.glyphs
+        return sum(glyphs[c][1] for c in text)
+
+    def draw(self, screen, text:str, pos:tuple):
+        """Draws text on screen
+
+        Args:
+            screen ([type]): The screen on which to blit
+            text (str): The text to draw
+            pos (tuple): The top left position of the text
+
+        Returns:
+            int: The width of the drawn text
+        """
+        self.ensure(text)
+        glyphs = self.glyphs
+        surface = self.surface
+        x, y = pos
+        sequence = []
+        for c in text:
+            area, advance = glyphs[c]
+            sequence.append((surface, (x, y), area))
+            x += advance
+        screen.blits(sequence, False)
+        return x-pos[0]
+
+# Glyph atlases by (font, color)
+atlas_cache = LRUCache(64)
+
+def get_glyph_atlas(font:pygame.font.Font, color:tuple)->GlyphAtlas:
+    """Returns the glyph atlas of a font and color, building it the first time
+    """
+    key = (font, color)
+    atlas = atlas_cache.get(key)
+    if atlas is None:
+        with font_lock:
+            atlas = atlas_cache.get(key)
+            if atlas is None:
+                atlas = atlas_cache.put(key, GlyphAtlas(font, color))
+    return atlas
+
+# =============================================== Observable properties ==========================================
+
+_unset = object()
+
+# Changes made during the current frame : (id(widget), name) -> (widget, name, value before the first change)
+pending_changes = {}
+
+def same_value(a, b)->bool:
+    """Tells if two values are equal, values that can not be compared (like numpy arrays) are considered different
+    """
+    if a is b:
+        return True
+    try:
+        return bool(a == b)
+    except Exception:
+        return False
+
+def attribute_setter(widget, attribute:str):
+    """Returns the setter of a widget attribute (setValue, setText, setPosition...) or a plain setattr if there is none
+    """
+    setter = getattr(widget, "set"+attribute[0].upper()+attribute[1:], None)
+    if setter is None:
+        setter = lambda value, widget=widget, attribute=attribute: setattr(widget, attribute, value)
+    return setter
+
+class ObservableProperty():
+    def __init__(self, default=None):
+        """A widget attribute whose changes are queued and notified once per frame.
+        Setting the value it already has does nothing.
+
+        Args:
+            default (optional): The value before the first assignment. Defaults to None.
+        """
+        self.default = default
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.storage = "_"+name
+
+    def __get__(self, widget, owner=None):
+        if widget is None:
+            return self
+        return widget.__dict__.get(self.storage, self.default)
+
+    def __set__(self, widget, value):
+        old_value = widget.__dict__.get(self.storage, _unset)
+        if old_value is not _unset and same_value(old_value, value):
+            return
+        widget.__dict__[self.storage] = value
+        if old_value is not _unset:
+            # Only the value before the first change of the frame is kept
+            pending_changes.setdefault((id(widget), self.name), (widget, self.name, old_value))
+
+def flush_changes():
+    """Notifies the observers of the properties changed since the last flush and invalidates the changed widgets.
+    A property changed back to its original value during the frame is not notified
+    """
+    global pending_changes
+    changes = pending_changes
+    pending_changes = {}
+    for widget, name, old_value in changes.values():
+        value = getattr(widget, name)
+        if same_value(old_value, value):
+            continue
+        widget.invalidate()
+        for callback in widget.observers.get(name, ()):
+            callback(widget, name, old_value, value)
+
+class Binding():
+    def __init__(self, source, widget, attribute:str):
+        """Binds a widget attribute to a model value read once per frame.
+        The widget is only touched when the model value changed. Values mutated in place
+        (same object) are not detected.
+
+        Args:
+            source (callable or tuple): A callable returning the model value or a (model, attribute name) pair
+            widget (Widget): The bound widget
+            attribute (str): The bound widget attribute, its setter is used if there is one
+        """
+        if isinstance(source, tuple):
+            model, name = source
+            source = lambda: getattr(model, name)
+        self.source = source
+        self.widget = widget
+        self.attribute = attribute
+        self.setter = attribute_setter(widget, attribute)
+        self.value = _unset
+
+    def update(self):
+        value = self.source()
+        if self.value is _unset or not same_value(value, self.value):
+            self.value = value
+            self.setter(value)
+
+# =============================================== Style sheets ==========================================
+
+# Parsed stylesheets by source text, can be seeded from a compiled UI plan
+parsed_stylesheets = {}
+# Images loaded by url and fonts loaded by (name, size)
+loaded_images = {}
+loaded_fonts = {}
+
+def parse_stylesheet(style:str)->tuple:
+    """Parses a css stylesheet, each distinct stylesheet text is parsed only once
+
+    Args:
+        style (str): The stylesheet
+
+    Returns:
+        tuple: The style rules as (selector, ((property name, value), ...)) pairs
+    """
+    rules = parsed_stylesheets.get(style)
+    if rules is None:
+        rules = tuple(
+            (rule.selectorText, tuple((property.name, property.value) for property in rule.style))
+            for rule in cssutils.parseString(style) if rule.type == rule.STYLE_RULE
+        )
+        parsed_stylesheets[style] = rules
+    return rules
+
+def load_image(url:str)->pygame.Surface:
+    """Loads an image from an url, each url is downloaded only once
+    """
+    image = loaded_images.get(url)
+    if image is None:
+        image_str = urlopen(url).read()
+        # create a file object (stream)
+        image_file = io.BytesIO(image_str)
+        image = pygame.image.load(image_file)
+        loaded_images[url] = image
+    return image
+
+def load_font(name:str, size:int)->pygame.font.Font:
+    """Loads a font, fonts are shared between styles
+    """
+    font = loaded_fonts.get((name, size))
+    if font is None:
+        font = pygame.font.Font(name+'.ttf', size)
+        loaded_fonts[(name, size)] = font
+    return font
+
+def parse_image_slice(value:str)->list:
+    """Parses the insets of a border-image-slice value.
+    Numbers are pixels, percentages are kept as strings and resolved against the image size
+    when it is sliced. The center is always drawn so the fill keyword is accepted and ignored,
+    like any token that is not a valid inset.
+
+    Args:
+        value (str): The css value
+
+    Returns:
+        list: The insets, as int pixels or 'n%' strings
+    """
+    insets = []
+    for token in str(value).split():
+        try:
+            if token.endswith('%'):
+                insets.append(f"{max(0.0, float(token[:-1]))}%")
+            else:
+                insets.append(max(0, int(float(token))))
+        except ValueError:
+            continue
+    return insets
+
+def apply_style_properties(style:WidgetStyle, properties:tuple):
+    """Applies parsed css properties to a style
+
+    Args:
+        style (WidgetStyle): The style to update
+        properties (tuple): The (property name, value) pairs
+    """
+    for name, value in properties:
+        if name == 'width':
+            if value is not None:
+                style.width = int(value)
+
+        if name == 'height':
+            if value is not None:
+                style.height = int(value)
+
+        if name == 'color':
+            v = get_color(value)
+            if v is not None:
+                style.text_color = v
+                                     
+        
+        if name == 'border-size':
+            style.border_size = int(value)
+        if name == 'border-radius':
+            style.border_radius = int(value)
+            
+            
+        if name == 'background-image':
+            bgi = value.strip()
+            if bgi.startswith("url"):
+                style.img = load_image(bgi[4:-1])
+                register_display_surface(style, "img")
+        if name == 'border-image-slice':
+            # Same order as css : top right bottom left, missing values are mirrored
+            v = parse_image_slice(value)
+            if len(v)>0:
+                v = (v*4)[:4] if len(v)<3 else v
+                style.img_slice = (v[0], v[1], v[2], v[3] if len(v)>3 else v[1])
+        if name == 'border-image-repeat':
+            style.img_repeat = 'stretch' if value == 'stretch' else 'repeat'
+        if name == 'background-color':
+            style.bg_color = get_color(value)
+
+        # Text stuff
+        if name=='left-margin':
+            style.left_margin = int(value)
+        if name=='right-margin':
+            style.right_margin = int(value)
+        if name=='align':
+            style.align = value
+        if name=='white-space':
+            style.wrap = value != 'nowrap'
+        if name=='text-overflow':
+            style.overflow = value
+        if name=='text-rendering':
+            style.text_rendering = 'atlas' if value == 'atlas' else 'cache'
+        if name == 'font-size':
+            style.font_size=int(float(value))
+            style.font = load_font(style.font_name, style.font_size)
+        if name == 'font-name':
+            style.font_name=value
+            style.font = load_font(style.font_name, style.font_size)
+
+# =============================================== Theme ==========================================
+
+class Theme():
+    def __init__(self, style:str=""):
+        """An application wide stylesheet.
+        Selectors are [Class][#id] key, where key is one of the widget style names (widget, btn.hover, list.item.normal...)
+        and Class matches the widget class or any of its base classes, for example :
+            btn.normal{background-color:#878787;}
+            Action btn.hover{color:yellow;}
+            #quit btn.normal{color:red;}
+        Id rules override class rules that override key only rules, the widget own stylesheet overrides the theme.
+
+        Styles are resolved once into computed styles shared by all the widgets having the same class, id, default
+        styles and stylesheets. Changing the theme updates the affected computed styles in place.
 
+        Args:
+            style (str, optional): The theme stylesheet. Defaults to "".
+        """
+        self.style = ""
+        self.rules = ()
+        # (classes, id, key, default signature, widget rules) -> computed style, kept as long as a widget uses it
+        self.computed = weakref.WeakValueDictionary()
+        self.defaults = {}
+        self.setStyleSheet(style)
+
+    def setStyleSheet(self, style:str):
+        """Replaces the theme stylesheet, only the computed styles matched by added or removed rules are recomputed
+        """
+        rules = []
+        for selectors, properties in parse_stylesheet(style):
+            for selector in selectors.split(","):
+                parts = selector.split()
+                scope = parts[0] if len(parts)>1 else ""
+                cls, _, widget_id = scope.partition("#")
+                rules.append((cls or None, widget_id or None, parts[-1], properties))
+        rules = tuple(rules)
+        changed = set(self.rules).symmetric_difference(rules)
+        self.style = style
+        self.rules = rules
+        for key, computed in list(self.computed.items()):
+            classes, widget_id, name, _, widget_rules = key
+            if any(self.matches(rule, classes, widget_id, name) for rule in changed):
+                computed.__dict__.update(vars(self.resolve(classes, widget_id, name, self.defaults[key], widget_rules)))
+
+    def matches(self, rule:tuple, classes:tuple, widget_id:str, key:str)->bool:
+        cls, rule_id, rule_key, _ = rule
+        return rule_key == key and (cls is None or cls in classes) and (rule_id is None or rule_id == widget_id)
+
+    def resolve(self, classes:tuple, widget_id:str, key:str, default:WidgetStyle, widget_rules:tuple)->WidgetStyle:
+        """Computes a style : the default style, then the matching theme rules by specificity, then the widget rules
+        """
+        style = replace(default)
+        matching = [rule for rule in self.rules if self.matches(rule, classes, widget_id, key)]
+        # Stable sort keeps the source order between rules of the same specificity
+        matching.sort(key=lambda rule: (rule[1] is not None, -classes.index(rule[0]) if rule[0] is not None else -len(classes)))
+        for rule in matching:
+            apply_style_properties(style, rule[3])
+        for rules in widget_rules:
+            for selector, properties in rules:
+                if selector == key:
+                    apply_style_properties(style, properties)
+        return style
+
+    def get(self, classes:tuple, widget_id:str, key:str, default:WidgetStyle, widget_rules:tuple)->WidgetStyle:
+        """Returns the shared computed style, resolving it on first use.
+        Computed styles no longer used by any widget are dropped
+        """
+        try:
+            cache_key = (classes, widget_id, key, tuple(vars(default).items()), widget_rules)
+            computed = self.computed.get(cache_key)
+        except TypeError:
+            # Unhashable default values, the style is only shared with the widgets using the same default object
+            cache_key = (classes, widget_id, key, ("unshared", id(default)), widget_rules)
+            computed = self.computed.get(cache_key)
+        if computed is None:
+            computed = self.resolve(classes, widget_id, key, default, widget_rules)
+            self.computed[cache_key] = computed
+            self.defaults[cache_key] = default
+            if len(self.defaults)>2*len(self.computed)+64:
+                self.defaults = {key:value for key, value in self.defaults.items() if key in self.computed}
+        return computed
+
+# The application theme, see WindowManager.setTheme
+theme = Theme()
 
 # =============================================== Widget ==========================================
 
+# Widgets invalidated during the current frame
+dirty_widgets = set()
+# Every live widget, for leak hunting (see live_widget_counts)
+live_widgets = weakref.WeakSet()
+# Widgets holding a value whose delivery is delayed (see Slider.flush), checked every frame even if they get no events
+pending_deliveries = set()
+
+def live_widget_counts()->dict:
+    """Returns the number of live widgets by class name, pooled widgets included
+    """
+    counts = {}
+    for widget in list(live_widgets):
+        name = type(widget).__name__
+        counts[name] = counts.get(name, 0)+1
+    return counts
+
+def forget_widget(widget):
+    """Drops the frame level references to a widget (invalidation and pending property changes)
+    """
+    dirty_widgets.discard(widget)
+    pending_deliveries.discard(widget)
+    for key in [key for key in pending_changes if key[0] == id(widget)]:
+        del pending_changes[key]
+
+def flush_deliveries():
+    """Delivers the delayed values that are due, including those of widgets that are hidden, culled or covered
+    """
+    for widget in list(pending_deliveries):
+        widget.flush()
+
+def outside_event(event):
+    """Returns a copy of a mouse event moved outside the screen, given to widgets hidden at the event position
+    """
+    return pygame.event.Event(event.type, dict(event.dict, pos=(-1,-1)))
+
 class Widget():
+    visible = ObservableProperty(True)
+    # Released widgets of this class can be pooled and reused (see WidgetPool)
+    reusable = True
+
+    @property
+    def parent(self):
+        """The parent (layout, window, menu...), only weakly referenced so that parents and children never keep each other alive
+        """
+        parent = self.__dict__.get("_parent")
+        return parent() if parent is not None else None
+
+    @parent.setter
+    def parent(self, parent):
+        self._parent = weakref.ref(parent) if parent is not None else None
+
     def __init__(
                     self,
                     parent=None,
@@ -80,13 +893,18 @@ to be applied to the widget.
         Args:
             rect (tuple, optional): A tuple of four numbers, representing the position of the widget. Defaults to [0,0,100,50].
             style (str, optional):  A string containing the CSS style properties for the widget. Defaults to "widget{background-color:#a9a9a9;}\n".
-            extra_styles (dict, optional): [description]. Defaults to {}.
+            extra_styles (dict, optional): The default styles by name, they are never modified as the widget styles are computed from them by the theme. Defaults to {}.
         """
 
 
         self.parent = parent
+        self.observers = {}
         self.visible = True
-        self.styles=self.merge_two_dicts({
+        self.dirty = True
+        live_widgets.add(self)
+        self.id = None
+        self.style_rules = ()
+        self.default_styles=self.merge_two_dicts({
             "widget":WidgetStyle()
         }, extra_styles)
         self.setStyleSheet(style)
@@ -96,6 +914,95 @@ to be applied to the widget.
             self.rect = None
             self.rect_left_top_right_bottom = None        
 
+    def children(self)->list:
+        """Returns the child widgets
+        """
+        return []
+
+    def subtree(self)->list:
+        """Returns the widget and all its descendants
+        """
+        widgets = [self]
+        for child in self.children():
+            widgets += child.subtree()
+        return widgets
+
+    def window(self):
+        """Returns the window manager the widget is shown in, None if it is not attached to one
+        """
+        parent = self.parent
+        while isinstance(parent, Widget):
+            parent = parent.parent
+        return parent
+
+    def now(self)->float:
+        """Returns the time in seconds of the clock of the window (see WindowManager.clock), so that replays are deterministic.
+        Widgets not attached to a window use time.monotonic
+        """
+        window = self.window()
+        return window.clock() if window is not None else time.monotonic()
+
+    def mouse_position(self)->tuple:
+        """Returns the mouse position given by the last mouse event of the window (see WindowManager.mouse_pos),
+        which replays reproduce, rather than the position of the system cursor
+        """
+        window = self.window()
+        return window.mouse_pos if window is not None else pygame.mouse.get_pos()
+
+    def remove(self):
+        """Removes the widget from its parent (layout, window, menu bar or menu)
+        """
+        parent = self.parent
+        if parent is not None:
+            parent.removeChild(self)
+
+    def removeChild(self, widget):
+        """Removes a child widget, implemented by the widgets having children
+        """
+        raise ValueError(f"{type(self).__name__} has no removable children")
+
+    def reset(self):
+        """Restores the state of a new widget before reusing it from a pool (see WidgetPool).
+        Interaction state, callbacks, observers and id are cleared, the stylesheets are kept.
+        Subclasses reset their own state
+        """
+        self.observers = {}
+        self.visible = True
+        if self.id is not None:
+            self.setId(None)
+        self.invalidate()
+
+    def dispose(self):
+        """Frees what the widget owns (sources, threads, processes, cached surfaces), called when it is released.
+        Does nothing by default
+        """
+        pass
+
+    def recycle(self, **properties):
+        """Prepares a pooled widget for reuse : resets it then sets properties through their setters (text, rect, value...)
+        """
+        self.reset()
+        for name, value in properties.items():
+            attribute_setter(self, name)(value)
+
+    def invalidate(self):
+        """Marks the widget as changed since the last frame
+        """
+        self.dirty = True
+        dirty_widgets.add(self)
+
+    def observe(self, name:str, callback):
+        """Registers a callback notified once per frame when an observable property changed
+
+        Args:
+            name (str): The property (text, value, visible, list...)
+            callback (callable): Called as callback(widget, name, old_value, new_value)
+        """
+        self.observers.setdefault(name, []).append(callback)
+
+    def unobserve(self, name:str, callback):
+        self.observers.get(name, []).remove(callback)
+
     def setParent(self, parent):
         self.parent = parent
         if self.parent is not None and self.rect is None:
@@ -149,31 +1056,130 @@ to be applied to the widget.
         return z
 
 
-    def draw_rect(self, screen, style: WidgetStyle, rect:tuple=None):
+    def draw_rect(self, screen, style: WidgetStyle, rect:tuple=None, cache:bool=True):
+        """Draws the background and the border of a style.
+        Rounded rectangles are pre-rendered once and cached, then simply blitted
+
+        Args:
+            screen ([type]): The screen on which to blit
+            style (WidgetStyle): The style to be used
+            rect (tuple, optional): The rectangle to fill. Defaults to the widget rectangle.
+            cache (bool, optional): Cache rounded rectangles, pass False for sizes that keep changing
+                                    (like a progress bar fill) so they do not evict useful entries. Defaults to True.
+        """
         if rect is None:
             rect = self.rect
+        if style.border_radius>0:
+            size = (int(rect[2]), int(rect[3]))
+            if size[0]<=0 or size[1]<=0 or (style.bg_color is None and style.border_size<=0):
+                return
+            key = (size, style.bg_color, style.border_color, style.border_size, style.border_radius)
+            if cache:
+                surface = rect_cache.get(key)
+                if surface is None:
+                    surface = rect_cache.put(key, render_rect(*key))
+            elif all(color is None or len(color)<4 or color[3]==255 for color in (style.bg_color, style.border_color)):
+                # Opaque colors need no blending, draw them in place like square rectangles
+                rect = (int(rect[0]), int(rect[1])) + size
+                if style.bg_color is not None:
+                    pygame.draw.rect(screen, style.bg_color, rect, border_radius = int(style.border_radius))
+                if style.border_size>0:
+                    pygame.draw.rect(screen, style.border_color, rect, style.border_size, border_radius = int(style.border_radius))
+                return
+            else:
+                surface = render_rect(*key)
+            screen.blit(surface, (rect[0], rect[1]))
+            return
+        # Square rectangles are plain fills, they are faster than any blit
         if style.bg_color is not None:
             pygame.draw.rect(screen,style.bg_color,rect, border_radius = style.border_radius)
         if style.border_size>0:
             pygame.draw.rect(screen,style.border_color,rect, style.border_size, border_radius = style.border_radius)
 
+    def draw_image(self, screen, style: WidgetStyle, rect:tuple=None):
+        """Draws the background image of a style.
+        The image is composed once per size (stretched or nine-sliced) and cached
+
+        Args:
+            screen ([type]): The screen on which to blit
+            style (WidgetStyle): The style to be used
+            rect (tuple, optional): The rectangle to fill. Defaults to the widget rectangle.
+        """
+        if rect is None:
+            rect = self.rect
+        size = (int(rect[2]), int(rect[3]))
+        if size[0]<=0 or size[1]<=0:
+            return
+        key = (style.img, size, style.img_slice, style.img_repeat)
+        surface = image_cache.get(key)
+        if surface is None:
+            if style.img.get_size() == size:
+                surface = style.img
+            elif style.img_slice is None:
+                surface = pygame.transform.scale(style.img, size)
+            else:
+                surface = render_nine_slice(style.img, size, style.img_slice, style.img_repeat)
+            image_cache.put(key, surface)
+        screen.blit(surface, (rect[0], rect[1]))
+
     def blit_text(self, text, style:WidgetStyle, screen, rect:tuple=None):
-        """Blits button text using a css style
+        """Blits button text using a css style.
+        The text is laid out (wrapped, truncated) and rendered through the shared text layout cache
 
         Args:
             style (WidgetStyle): The style to be used
             screen ([type]): The screen on which to blit
+            rect (tuple, optional): The rectangle in which to blit the text. Defaults to the widget rectangle.
+
+        Returns:
+            int: The width of the widest blitted line
         """
         if rect is None:
             rect = self.rect
-        text_render = style.font.render(text,True, style.text_color)
-        if style.align =='center':
-            screen.blit(text_render,(rect[0]+rect[2]//2-text_render.get_width()//2,rect[1]+rect[3]//2-text_render.get_height()//2))   
-        elif style.align =='left':
-            screen.blit(text_render,(rect[0]+style.left_margin,rect[1]+rect[3]//2-text_render.get_height()//2))   
-        elif style.align =='right':
-            screen.blit(text_render,(rect[0]+rect[2]-text_render.get_width(),rect[1]+rect[3]//2-text_render.get_height()//2))   
-        return text_render.get_width()
+        font = style.font
+        line_height = font.get_linesize()
+        width = rect[2]-style.left_margin-style.right_margin
+        atlas = None
+        if style.text_rendering == 'atlas':
+            atlas = get_glyph_atlas(font, style.text_color)
+        if atlas is not None and not style.wrap and style.overflow != 'ellipsis':
+            # Changing texts would only flush the layout cache
+            lines = text.split("\n")
+        else:
+            max_lines = None
+            if style.wrap and style.overflow == 'ellipsis':
+                max_lines = max(1, 1+(rect[3]-font.get_height())//line_height)
+            lines = text_layout.layout(text, font, width, style.wrap, style.overflow, max_lines)
+
+        if style.overflow != 'visible':
+            clip = screen.get_clip()
+            screen.set_clip(clip.clip(rect))
+        y = rect[1]+rect[3]//2-(font.get_height()+line_height*(len(lines)-1))//2
+        text_width = 0
+        for line in lines:
+            if atlas is None:
+                text_render = text_layout.render(line, font, style.text_color)
+                line_width = text_render.get_width()
+            else:
+                line_width = atlas.size(line)
+            if style.align =='center':
+                x = rect[0]+rect[2]//2-line_width//2
+            elif style.align =='left':
+                x = rect[0]+style.left_margin
+            elif style.align =='right':
+                x = rect[0]+rect[2]-line_width
+            else:
+                x = None
+            if x is not None:
+                if atlas is None:
+                    screen.blit(text_render,(x,y))
+                else:
+                    atlas.draw(screen, line, (x,y))
+            text_width = max(text_width, line_width)
+            y += line_height
+        if style.overflow != 'visible':
+            screen.set_clip(clip)
+        return text_width
 
     def setStyleSheet(self, style:str):
         """Sets the button stylesheet
@@ -181,65 +1187,34 @@ to be applied to the widget.
         Args:
             style (str): A css stylesheet to specify the button caracteristics
         """
-        self.style = cssutils.parseString(style)
-        
-        for rule in self.style:
-            if rule.type == rule.STYLE_RULE:
-                try:
-                    style = self.styles[rule.selectorText]
-                except:
-                    continue
-                # find property
-                for property in rule.style:
-                    if property.name == 'width':
-                        v = property.value
-                        if v is not None:
-                            style.width = int(v)
-
-                    if property.name == 'height':
-                        v = property.value
-                        if v is not None:
-                            style.height = int(v)
-
-                    if property.name == 'color':
-                        v = get_color(property.value)
-                        if v is not None:
-                            style.text_color = v
-                                                 
-                    
-                    if property.name == 'border-size':
-                        style.border_size = int(property.value)
-                    if property.name == 'border-radius':
-                        style.border_radius = int(property.value)
-                        
-                        
-                    if property.name == 'background-image':
-                        bgi = property.value.strip()
-                        if bgi.startswith("url"):
-                            image_url = bgi[4:-1]
-                            print(image_url)
-                            image_str = urlopen(image_url).read()
-                            # create a file object (stream)
-                            image_file = io.BytesIO(image_str)
-                            image = pygame.image.load(image_file)
-                        if image is not None:
-                            style.img = image
-                    if property.name == 'background-color':
-                        style.bg_color = get_color(property.value)
-
-                    # Text stuff
-                    if property.name=='left-margin':
-                        style.left_margin = int(property.value)
-                    if property.name=='right-margin':
-                        style.right_margin = int(property.value)
-                    if property.name=='align':
-                        style.align = property.value
-                    if property.name == 'font-size':
-                        style.font_size=property.value
-                        style.font = pygame.font.Font(style.font_name+'.ttf', style.font_size)
-                    if property.name == 'font-name':
-                        style.font_name=property.value
-                        style.font = pygame.font.Font(style.font_name+'.ttf', style.font_size)
+        self.style = style
+        self.applyStyleRules(parse_stylesheet(style))
+
+    def applyStyleRules(self, rules:tuple):
+        """Adds already parsed style rules (see parse_stylesheet) on top of the widget styles
+
+        Args:
+            rules (tuple): The rules as (selector, ((property name, value), ...)) pairs
+        """
+        if rules not in self.style_rules:
+            self.style_rules = self.style_rules+(rules,)
+        self.resolve_styles()
+
+    def setId(self, id:str):
+        """Sets the id used by the theme selectors (Class#id key)
+        """
+        self.id = id
+        self.resolve_styles()
+
+    def resolve_styles(self):
+        """Fetches the computed styles of the widget from the theme.
+        Widgets of the same class, id, default styles and stylesheets share the same style objects
+        """
+        classes = tuple(cls.__name__ for cls in type(self).__mro__)
+        self.styles = {
+            key:theme.get(classes, self.id, key, default, self.style_rules)
+            for key, default in self.default_styles.items()
+        }
 
     def paint(self, screen):
         """Paints the button
@@ -253,7 +1228,7 @@ to be applied to the widget.
             if style.bg_color is not None:
                 self.draw_rect(screen, style)
         else:
-            screen.blit(pygame.transform.scale(style.img, (self.rect[2], self.rect[3])), (self.rect[0],self.rect[1]))
+            self.draw_image(screen, style)
 
     def handle_events(self, events):
         pass
@@ -266,6 +1241,44 @@ class Layout(Widget):
     def addWidget(self, widget:Widget):
         self.widgets.append(widget)
 
+    def entry(self, widget:Widget):
+        """Returns the entry of widget in self.widgets
+        """
+        for entry in self.widgets:
+            if entry is widget or isinstance(entry, list) and entry[1] is widget:
+                return entry
+        raise ValueError("The widget is not in this layout")
+
+    def removeWidget(self, widget:Widget)->Widget:
+        """Removes a widget from the layout, the window forgets its tweens and bindings
+
+        Returns:
+            Widget: The removed widget
+        """
+        self.widgets.remove(self.entry(widget))
+        window = self.window()
+        if window is not None:
+            window.forget(widget)
+        widget.parent = None
+        return widget
+
+    def removeChild(self, widget:Widget):
+        self.removeWidget(widget)
+
+    def clear(self):
+        """Removes all the widgets
+        """
+        for widget in self.children():
+            self.removeWidget(widget)
+
+    def children(self)->list:
+        return [entry[1] if isinstance(entry, list) else entry for entry in self.widgets]
+
+    def arrange(self)->list:
+        """Places the children and returns them in paint order, None if the layout paints them itself
+        """
+        return None
+
 class HorizontalLayout(Layout):
     def __init__(self, parent=None, rect: tuple = None, style: str = "widget{background-color:#a9a9a9;}\n", extra_styles={}):
         super().__init__(parent, rect, style, extra_styles)
@@ -275,6 +1288,12 @@ class HorizontalLayout(Layout):
         widget.parent = self
 
     def paint(self, screen):
+        for widget in self.arrange():
+            widget.paint(screen)
+
+    def arrange(self)->list:
+        """Places the children, returns them in paint order
+        """
         l = len(self.widgets)
         if self.rect is None:
             x = self.parent.rect[0]
@@ -291,7 +1310,7 @@ class HorizontalLayout(Layout):
                 percent=1/l            
             widget.setRect([x,y,int(w*percent),h])
             x += int(w*percent)
-            widget.paint(screen)
+        return [widget for _, widget in self.widgets]
 
     def handle_events(self, events):
         for percent, widget in self.widgets:
@@ -313,6 +1332,12 @@ class VerticalLayout(Layout):
         widget.parent = self
 
     def paint(self, screen):
+        for widget in self.arrange():
+            widget.paint(screen)
+
+    def arrange(self)->list:
+        """Places the children, returns them in paint order
+        """
         l = len(self.widgets)
         if self.rect is None:
             x = self.parent.rect[0]
@@ -329,7 +1354,7 @@ class VerticalLayout(Layout):
                 percent=1/l            
             widget.setRect([x,y,w,int(h*percent)])
             y += int(h*percent)
-            widget.paint(screen)
+        return [widget for _, widget in self.widgets]
 
     def handle_events(self, events):
         for percent, widget in self.widgets:
@@ -347,6 +1372,12 @@ class FormLayout(Layout):
         widget.parent = self
 
     def paint(self, screen):
+        for widget in self.arrange():
+            widget.paint(screen)
+
+    def arrange(self)->list:
+        """Places the children, returns them in paint order
+        """
         l = len(self.widgets)
         if self.rect is None:
             x = self.parent.rect[0]
@@ -367,29 +1398,575 @@ class FormLayout(Layout):
             title.setRect([x,y,title_width,widget.rect[3]])     
             widget.setRect([x+title_width,y,w-title_width,widget.rect[3]])
             y += int(widget.rect[3])
-            title.paint(screen)
-            widget.paint(screen)
+        return [item for row in self.widgets for item in row]
 
     def handle_events(self, events):
         for percent, widget in self.widgets:
             widget.handle_events(events)
+# =============================================== Scroll area ==========================================
+
+class ScrollArea(Layout):
+    def __init__(
+                    self,
+                    parent=None,
+                    rect:tuple=None,
+                    style:str="",
+                    row_height:int=30,
+                    scroll_step:int=40,
+                    scrollbar_width:int=10,
+                    extra_styles={}
+                ):
+        """Builds a vertically scrolling container, its children are stacked with their own heights.
+        Only the children intersecting the viewport are painted and receive the events, all painting is clipped to the viewport.
+        The viewport is kept in a surface : scrolling moves the already rendered pixels (Surface.scroll) and paints only
+        the exposed strip, and a frame without changes inside the area is a single blit.
+        The children are repainted when one of them is invalidated or on input events, call invalidate after
+        changing a child attribute that is not observable.
+
+        Args:
+            row_height (int, optional): The height of the children added without height nor rectangle. Defaults to 30.
+            scroll_step (int, optional): The scrolled pixels per wheel step. Defaults to 40.
+            scrollbar_width (int, optional): The width of the scrollbar, 0 to hide it. Defaults to 10.
+        """
+        self.row_height = row_height
+        self.scroll_step = scroll_step
+        self.scrollbar_width = scrollbar_width
+        super().__init__(parent, rect, style, self.merge_two_dicts({
+            "scroll.bar":WidgetStyle(bg_color=get_color("#565656")),
+            "scroll.handle":WidgetStyle(border_radius=4, bg_color=get_color("#a9a9a9")),
+        }, extra_styles))
+        self.scroll_y = 0
+        self.content_height = 0
+        self.surface = None
+        self.rendered_scroll = None
+        self.repaint = True
+        self.mouse_inside = False
+        self.dragging = False
+
+    def reset(self):
+        Widget.reset(self)
+        self.scroll_y = 0
+        self.repaint = True
+        self.mouse_inside = False
+        self.dragging = False
+
+    def dispose(self):
+        self.surface = None
+        self.rendered_scroll = None
+
+    def addWidget(self, widget:Widget, height:int=None):
+        """Adds a widget under the others
+
+        Args:
+            widget (Widget): The widget
+            height (int, optional): Its height. Defaults to the height of its rectangle, or row_height.
+        """
+        if height is None:
+            height = widget.rect[3] if widget.rect is not None else self.row_height
+        self.widgets.append([height, widget])
+        self.content_height += height
+        widget.parent = self
+        self.repaint = True
+
+    def removeWidget(self, widget:Widget)->Widget:
+        self.content_height -= self.entry(widget)[0]
+        self.repaint = True
+        return super().removeWidget(widget)
+
+    def viewport(self)->pygame.Rect:
+        """Returns the rectangle in which the children are shown
+        """
+        rect = self.rect if self.rect is not None else self.parent.rect
+        return pygame.Rect(rect[0], rect[1], max(0, rect[2]-self.scrollbar_width), rect[3])
+
+    def max_scroll(self)->int:
+        return max(0, self.content_height-self.viewport().h)
+
+    def scrollTo(self, y:int):
+        """Scrolls so that the content line y is at the top of the viewport
+        """
+        self.scroll_y = int(min(max(0, y), self.max_scroll()))
+
+    def scrollBy(self, dy:int):
+        self.scrollTo(self.scroll_y+dy)
+
+    def ensureVisible(self, widget:Widget):
+        """Scrolls the least needed to show a child
+        """
+        top = 0
+        for height, child in self.widgets:
+            if child is widget:
+                break
+            top += height
+        else:
+            raise ValueError("The widget is not in this scroll area")
+        viewport = self.viewport()
+        if top<self.scroll_y:
+            self.scrollTo(top)
+        elif top+height>self.scroll_y+viewport.h:
+            self.scrollTo(top+height-viewport.h)
+
+    def visible_children(self, area:pygame.Rect=None)->list:
+        """Returns the children intersecting an area of the screen, the viewport by default
+        """
+        if area is None:
+            area = self.viewport()
+        return [widget for _, widget in self.widgets if widget.visible and area.colliderect(widget.rect)]
+
+    def arrange(self)->None:
+        """Places the children on the screen according to the scroll position.
+        The layouts among the visible children are arranged too so that their children receive events at the right places.
+        The scroll area paints its children itself (viewport clipping and culling), so no paint order is returned
+        """
+        def place(widget):
+            if isinstance(widget, Layout):
+                for child in widget.arrange() or ():
+                    place(child)
+
+        viewport = self.viewport()
+        self.scrollTo(self.scroll_y)
+        y = viewport.y-self.scroll_y
+        for height, widget in self.widgets:
+            widget.setRect([viewport.x, y, viewport.w, height])
+            if y<viewport.bottom and y+height>viewport.top and widget.visible:
+                place(widget)
+            y += height
+        return None
+
+    def content_changed(self)->bool:
+        """Tells if a child was invalidated during this frame
+        """
+        for widget in dirty_widgets:
+            while widget is not None:
+                if widget is self:
+                    return True
+                widget = widget.parent if isinstance(widget, Widget) else None
+        return False
+
+    def paint_area(self, screen, area:pygame.Rect):
+        """Paints the background and the children intersecting an area of the screen, clipped to it
+        """
+        clip = screen.get_clip()
+        screen.set_clip(clip.clip(area))
+        style = self.styles["widget"]
+        if style.img is None:
+            if style.bg_color is not None:
+                self.draw_rect(screen, style, self.viewport())
+        else:
+            self.draw_image(screen, style, self.viewport())
+        for widget in self.visible_children(area):
+            widget.paint(screen)
+        screen.set_clip(clip)
+
+    def paint(self, screen):
+        viewport = self.viewport()
+        self.arrange()
+        if viewport.w<=0 or viewport.h<=0:
+            return
+        if self.surface is None or self.surface.get_size() != viewport.size or self.surface.get_bitsize() != screen.get_bitsize():
+            self.surface = pygame.Surface(viewport.size, 0, screen)
+            self.surface.set_alpha(None)
+            self.rendered_scroll = None
+
+        dy = 0 if self.rendered_scroll is None else self.rendered_scroll-self.scroll_y
+        if self.rendered_scroll is None or self.repaint or self.content_changed() or abs(dy)>=viewport.h:
+            area = viewport
+        elif dy == 0:
+            area = None
+        else:
+            # Move what is already rendered and only paint the exposed strip
+            self.surface.scroll(0, dy)
+            if dy<0:
+                area = pygame.Rect(viewport.x, viewport.bottom+dy, viewport.w, -dy)
+            else:
+                area = pygame.Rect(viewport.x, viewport.y, viewport.w, dy)
+
+        screen.blit(self.surface, viewport.topleft)
+        if area is not None:
+            self.paint_area(screen, area)
+            # Keep the painted pixels, a strip partly clipped by the screen is painted again next frame
+            painted = screen.get_clip().clip(area)
+            self.surface.blit(screen, (painted.x-viewport.x, painted.y-viewport.y), painted)
+            self.rendered_scroll = self.scroll_y if painted == area else None
+            self.repaint = False
+        self.paint_scrollbar(screen)
+
+    def scrollbar_rects(self):
+        """Returns the bar and handle rectangles, None if there is nothing to scroll
+        """
+        if self.scrollbar_width<=0 or self.content_height<=self.viewport().h:
+            return None
+        viewport = self.viewport()
+        bar = pygame.Rect(viewport.right, viewport.y, self.scrollbar_width, viewport.h)
+        handle_h = max(self.scrollbar_width, viewport.h*viewport.h//self.content_height)
+        handle_y = bar.y+(bar.h-handle_h)*self.scroll_y//max(1, self.max_scroll())
+        return bar, pygame.Rect(bar.x, handle_y, bar.w, handle_h)
+
+    def paint_scrollbar(self, screen):
+        rects = self.scrollbar_rects()
+        if rects is None:
+            return
+        bar, handle = rects
+        self.draw_rect(screen, self.styles["scroll.bar"], bar)
+        self.draw_rect(screen, self.styles["scroll.handle"], handle)
+
+    def handle_events(self, events):
+        """Scrolls on wheel and scrollbar drags, and forwards the other events to the visible children.
+        Mouse events outside the viewport are forwarded with a position outside the screen, so that the hidden parts
+        of the children do not react to them
+        """
+        viewport = self.viewport()
+        scroll_y = self.scroll_y
+        forwarded = []
+        for event in events:
+            if event.type == pygame.MOUSEWHEEL:
+                if viewport.collidepoint(self.mouse_position()):
+                    self.scrollBy(-event.y*self.scroll_step)
+                    continue
+            elif hasattr(event, "pos"):
+                inside = viewport.collidepoint(event.pos)
+                if event.type == pygame.MOUSEBUTTONDOWN and event.button in (4, 5) and inside:
+                    # Legacy wheel buttons, the MOUSEWHEEL event scrolls
+                    continue
+                if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                    rects = self.scrollbar_rects()
+                    if rects is not None and rects[0].collidepoint(event.pos):
+                        bar, handle = rects
+                        if not handle.collidepoint(event.pos):
+                            self.scrollTo((event.pos[1]-bar.y-handle.h//2)*self.max_scroll()//max(1, bar.h-handle.h))
+                        self.dragging = True
+                        continue
+                elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
+                    self.dragging = False
+                elif event.type == pygame.MOUSEMOTION and self.dragging:
+                    bar, handle = self.scrollbar_rects() or (viewport, viewport)
+                    self.scrollBy(event.rel[1]*self.max_scroll()//max(1, bar.h-handle.h))
+                    continue
+                if event.type != pygame.MOUSEMOTION or inside or self.mouse_inside:
+                    self.repaint = True
+                if event.type == pygame.MOUSEMOTION:
+                    self.mouse_inside = inside
+                if not inside:
+                    event = outside_event(event)
+            else:
+                self.repaint = True
+            forwarded.append(event)
+        if self.scroll_y != scroll_y:
+            self.arrange()
+        if len(forwarded)>0:
+            for widget in self.visible_children(viewport):
+                widget.handle_events(forwarded)
+
+# =============================================== Widget pool ==========================================
+
+class WidgetPool():
+    def __init__(self, max_per_class:int=64):
+        """Keeps released widgets by class to reuse them instead of building new ones.
+        Released widgets are removed from their parent, forgotten by the window and disposed (see Widget.dispose),
+        acquired ones are reset and given their new properties (see Widget.recycle).
+
+        Args:
+            max_per_class (int, optional): The maximum number of pooled widgets per class, extra ones are left to the garbage collector. Defaults to 64.
+        """
+        self.max_per_class = max_per_class
+        self.pools = {}
+
+    def acquire(self, cls, *args, **properties)->Widget:
+        """Returns a pooled widget of class cls, or a new one built with args, with the given properties set
+
+        Args:
+            cls (type): The widget class
+            args: The constructor arguments, only used when no widget of this class is pooled
+            properties: Set through their setters in both cases (text="OK", rect=[0,0,100,30]...)
+        """
+        pool = self.pools.get(cls)
+        if pool:
+            widget = pool.pop()
+            widget.recycle(**properties)
+            return widget
+        widget = cls(*args)
+        for name, value in properties.items():
+            attribute_setter(widget, name)(value)
+        return widget
+
+    def release(self, widget:Widget, recursive:bool=True):
+        """Removes a widget from its parent and keeps it for reuse
+
+        Args:
+            widget (Widget): The widget
+            recursive (bool, optional): Release the children too (they are removed from the widget). Defaults to True.
+        """
+        widget.remove()
+        forget_widget(widget)
+        if recursive:
+            for child in widget.children():
+                self.release(child, True)
+        widget.dispose()
+        if not widget.reusable:
+            return
+        pool = self.pools.setdefault(type(widget), [])
+        if len(pool)<self.max_per_class:
+            pool.append(widget)
+
+    def clear(self):
+        self.pools.clear()
+
+    def __len__(self):
+        return sum(len(pool) for pool in self.pools.values())
+
+# Widget pool shared by the application
+widget_pool = WidgetPool()
+
 # =============================================== Timer ==========================================
 class Timer():
-    def __init__(self, callback_fn, intrval_s:float=0.1) -> None:
+    def __init__(self, callback_fn, intrval_s:float=0.1, clock=time.time) -> None:
         self.callback_fn = callback_fn
         self.intrval_s = intrval_s
+        self.clock = clock
         self.started = False
     def start(self):
         self.started = True
-        self.last_time = time.time()
+        self.last_time = self.clock()
     def stop(self):
         self.started = False    
     def process(self):
-        dt = time.time() - self.last_time
+        dt = self.clock() - self.last_time
         if dt>=self.intrval_s:
             if self.callback_fn is not None:
                 self.callback_fn()
-            self.last_time = time.time()
+            self.last_time = self.clock()
+
+# =============================================== Animation ==========================================
+
+def _ease_out_bounce(t):
+    t = t.copy()
+    out = np.empty_like(t)
+    for limit, shift, offset in ((1/2.75, 0, 0), (2/2.75, 1.5/2.75, 0.75), (2.5/2.75, 2.25/2.75, 0.9375), (np.inf, 2.625/2.75, 0.984375)):
+        mask = t<limit
+        u = t[mask]-shift
+        out[mask] = 7.5625*u*u+offset
+        t[mask] = np.inf
+    return out
+
+# Easing functions, all working on numpy arrays of progress values in [0, 1]
+easings = {
+    "linear":       lambda t: t,
+    "in_quad":      lambda t: t*t,
+    "out_quad":     lambda t: t*(2-t),
+    "in_out_quad":  lambda t: np.where(t<0.5, 2*t*t, -1+(4-2*t)*t),
+    "in_cubic":     lambda t: t**3,
+    "out_cubic":    lambda t: (t-1)**3+1,
+    "in_out_cubic": lambda t: np.where(t<0.5, 4*t**3, (t-1)*(2*t-2)**2+1),
+    "in_sine":      lambda t: 1-np.cos(t*np.pi/2),
+    "out_sine":     lambda t: np.sin(t*np.pi/2),
+    "in_out_sine":  lambda t: (1-np.cos(t*np.pi))/2,
+    "out_back":     lambda t: 1+2.70158*(t-1)**3+1.70158*(t-1)**2,
+    "out_bounce":   _ease_out_bounce,
+}
+_easing_names = list(easings)
+
+class Animator():
+    def __init__(self, clock=time.monotonic):
+        """Builds a tween engine.
+        All running tweens are stored as numpy arrays of channels (one channel per animated component),
+        so advancing them is a single vectorized pass per frame whatever their number.
+        Finished tweens are retired automatically and the animated widgets are invalidated.
+
+        Args:
+            clock (callable, optional): The clock giving the time in seconds. Defaults to time.monotonic.
+        """
+        self.clock = clock
+        self.next_id = 0
+        # Per channel arrays
+        self.ids = np.zeros(0, np.int64)
+        self.starts = np.zeros(0)
+        self.deltas = np.zeros(0)
+        self.start_times = np.zeros(0)
+        self.durations = np.zeros(0)
+        self.easing_ids = np.zeros(0, np.int64)
+        # Per tween information : id -> (widget, setter, number of channels, on_finished, key, is_vector)
+        self.tweens = {}
+        self.pending = []
+        self.cancelled = set()
+
+    def animate(self, widget, attribute, start, end, duration_s:float, easing:str="in_out_quad", delay_s:float=0, on_finished=None)->int:
+        """Animates a widget attribute from start to end.
+        A tween already running on the same widget attribute is replaced.
+
+        Args:
+            widget (Widget): The animated widget
+            attribute (str or callable): The attribute name, its setter (setValue, setPosition...) is used if there is one.
+                Or a callable receiving the value.
+            start (float or tuple): The start value, tuples animate each component
+            end (float or tuple): The end value
+            duration_s (float): The duration in seconds
+            easing (str, optional): One of the easings names. Defaults to "in_out_quad".
+            delay_s (float, optional): A delay before starting. Defaults to 0.
+            on_finished (callable, optional): Called without argument when the tween ends. Defaults to None.
+
+        Returns:
+            int: The id of the tween
+        """
+        if callable(attribute):
+            setter = attribute
+            key = (id(widget), attribute)
+        else:
+            setter = attribute_setter(widget, attribute)
+            key = (id(widget), attribute)
+        for tween_id, tween in self.tweens.items():
+            if tween[4] == key:
+                self.cancelled.add(tween_id)
+        is_vector = np.ndim(end)>0
+        start = np.atleast_1d(np.asarray(start, np.float64))
+        end = np.atleast_1d(np.asarray(end, np.float64))
+        tween_id = self.next_id
+        self.next_id += 1
+        self.tweens[tween_id] = (widget, setter, len(start), on_finished, key, is_vector)
+        self.pending.append((tween_id, start, end-start, self.clock()+delay_s, max(duration_s, 1e-9), _easing_names.index(easing)))
+        return tween_id
+
+    def cancel(self, tween_id:int):
+        """Stops a tween where it is
+        """
+        if tween_id in self.tweens:
+            self.cancelled.add(tween_id)
+
+    def cancelWidget(self, widget):
+        """Stops all the tweens of a widget
+        """
+        for tween_id, tween in self.tweens.items():
+            if tween[0] is widget:
+                self.cancelled.add(tween_id)
+
+    @property
+    def active(self):
+        return len(self.tweens)
+
+    def update(self):
+        """Advances all the tweens, to be called once per frame
+        """
+        if len(self.pending)>0:
+            n = [len(p[1]) for p in self.pending]
+            self.ids = np.concatenate([self.ids]+[np.full(k, p[0]) for k, p in zip(n, self.pending)])
+            self.starts = np.concatenate([self.starts]+[p[1] for p in self.pending])
+            self.deltas = np.concatenate([self.deltas]+[p[2] for p in self.pending])
+            self.start_times = np.concatenate([self.start_times]+[np.full(k, p[3]) for k, p in zip(n, self.pending)])
+            self.durations = np.concatenate([self.durations]+[np.full(k, p[4]) for k, p in zip(n, self.pending)])
+            self.easing_ids = np.concatenate([self.easing_ids]+[np.full(k, p[5]) for k, p in zip(n, self.pending)])
+            self.pending = []
+        if len(self.cancelled)>0:
+            self.retire(~np.isin(self.ids, list(self.cancelled)))
+            for tween_id in self.cancelled:
+                self.tweens.pop(tween_id, None)
+            self.cancelled = set()
+        if len(self.ids) == 0:
+            return
+
+        progress = np.clip((self.clock()-self.start_times)/self.durations, 0, 1)
+        started = progress>0
+        eased = np.empty_like(progress)
+        for easing_id in np.unique(self.easing_ids).tolist():
+            mask = self.easing_ids == easing_id
+            eased[mask] = easings[_easing_names[easing_id]](progress[mask])
+        values = (self.starts+self.deltas*eased).tolist()
+
+        # Channels of a tween are contiguous
+        i = 0
+        ids = self.ids.tolist()
+        started = started.tolist()
+        while i<len(ids):
+            widget, setter, n, _, _, is_vector = self.tweens[ids[i]]
+            if started[i]:
+                setter(values[i:i+n] if is_vector else values[i])
+                if isinstance(widget, Widget):
+                    widget.invalidate()
+            i += n
+
+        finished = progress>=1
+        if finished.any():
+            finished_ids = np.unique(self.ids[finished]).tolist()
+            self.retire(~finished)
+            for tween_id in finished_ids:
+                on_finished = self.tweens.pop(tween_id)[3]
+                if on_finished is not None:
+                    on_finished()
+
+    def retire(self, keep:np.ndarray):
+        self.ids = self.ids[keep]
+        self.starts = self.starts[keep]
+        self.deltas = self.deltas[keep]
+        self.start_times = self.start_times[keep]
+        self.durations = self.durations[keep]
+        self.easing_ids = self.easing_ids[keep]
+
+# =============================================== Overlays ==========================================
+
+class Overlay():
+    def __init__(self, widget:Widget, modal:bool=False):
+        """A layer shown above the widgets of the window (drop down menus, popups...), see WindowManager.pushOverlay.
+        The widget is rendered once into a surface composited on top of the window, and rendered again only when
+        it is invalidated or receives input events. Mouse events over the layer do not reach the layers below, so
+        the widgets under an open popup are neither hovered nor clicked.
+        Layers are opaque rectangles.
+
+        Args:
+            widget (Widget): The widget shown in the layer, it is painted in its rectangle
+            modal (bool, optional): The layers below receive no input at all while this one is shown. Defaults to False.
+        """
+        self.widget = widget
+        self.modal = modal
+        self.surface = None
+        self.repaint = True
+        self.mouse_inside = False
+
+    @property
+    def rect(self)->pygame.Rect:
+        return pygame.Rect(self.widget.rect)
+
+    def paint(self, screen):
+        rect = self.rect.clip(screen.get_rect())
+        if rect.w<=0 or rect.h<=0:
+            return
+        if self.surface is None or self.surface.get_size() != rect.size or self.surface.get_bitsize() != screen.get_bitsize():
+            self.surface = pygame.Surface(rect.size, 0, screen)
+            self.surface.set_alpha(None)
+            self.repaint = True
+        if self.repaint or any(member in dirty_widgets for member in self.widget.subtree()):
+            clip = screen.get_clip()
+            screen.set_clip(clip.clip(rect))
+            self.widget.paint(screen)
+            screen.set_clip(clip)
+            self.surface.blit(screen, (0, 0), rect)
+            self.repaint = False
+        else:
+            screen.blit(self.surface, rect.topleft)
+
+    def handle_events(self, events:list)->list:
+        """Gives the events to the widget of the layer
+
+        Returns:
+            list: The events for the layers below
+        """
+        rect = self.rect
+        below = []
+        for event in events:
+            if hasattr(event, "pos"):
+                inside = rect.collidepoint(event.pos)
+                if event.type != pygame.MOUSEMOTION or inside or self.mouse_inside:
+                    self.repaint = True
+                if event.type == pygame.MOUSEMOTION:
+                    self.mouse_inside = inside
+                if not self.modal:
+                    below.append(outside_event(event) if inside else event)
+                elif event.type in (pygame.MOUSEMOTION, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP):
+                    below.append(outside_event(event))
+            else:
+                if event.type != pygame.MOUSEWHEEL:
+                    self.repaint = True
+                if not self.modal or event.type in (pygame.QUIT, pygame.VIDEORESIZE):
+                    below.append(event)
+        self.widget.handle_events(events)
+        return below
 
 # =============================================== Window Manager ==========================================
 
@@ -405,11 +1982,28 @@ class WindowManager():
         else:
             self.screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
         pygame.display.set_caption(window_title)
+        # Convert the surfaces loaded before the display existed
+        convert_display_surfaces()
         self.widgets = []
         self.events = None
         self.Running = True
         self.timers=[]
         self.menu = None
+        # Replaced by a fixed step clock and the logged events during a replay (see replayInput)
+        self.clock = time.monotonic
+        self.event_source = pygame.event.get
+        # Position of the last mouse event, used for events without position (wheel)
+        self.mouse_pos = pygame.mouse.get_pos()
+        self.animator = Animator(lambda: self.clock())
+        self.bindings = []
+        self.theme = theme
+        self.render_threads = 1
+        self.render_pool = None
+        # Called with the screen once painted, and returning events to inject (see stream)
+        self.frame_listeners = []
+        self.input_sources = []
+        # Layers shown above the widgets and the menu bar, the last one on top (see pushOverlay)
+        self.overlays = []
         self.update_rect()
 
 
@@ -417,12 +2011,137 @@ class WindowManager():
         self.menu = MenuBar(self)
         return self.menu
 
+    def pushOverlay(self, widget:Widget, modal:bool=False)->Overlay:
+        """Shows a widget in a layer above the window (popups, drop down menus), see Overlay
+
+        Args:
+            widget (Widget): The widget, painted in its rectangle
+            modal (bool, optional): The rest of the window receives no input while the layer is shown. Defaults to False.
+
+        Returns:
+            Overlay: The layer, on top of the others
+        """
+        overlay = Overlay(widget, modal)
+        self.overlays.append(overlay)
+        return overlay
+
+    def removeOverlay(self, widget:Widget):
+        """Removes the layers showing a widget
+        """
+        self.overlays = [overlay for overlay in self.overlays if overlay.widget is not widget]
+
+    def setTheme(self, style:str):
+        """Sets the application theme stylesheet (see Theme).
+        Only the computed styles affected by the changed rules are recomputed
+
+        Args:
+            style (str): The theme stylesheet
+        """
+        self.theme.setStyleSheet(style)
+
+    def setRenderThreads(self, threads:int):
+        """Experimental : paints the widgets on a pool of threads.
+        The leaves of the layouts are painted concurrently, each one clipped to its rectangle, on surfaces sharing the
+        pixels of the screen. Top level widgets overlapping each other are painted together in their order.
+        Pygame releases the GIL while filling, blitting and scaling, so image heavy interfaces may paint faster, but
+        the threads contend for the GIL on everything else and small interfaces usually paint slower : measure before
+        enabling it (benchmarks/parallel_rendering.py). It is off by default.
+        The output is not pixel identical to the serial painting : each leaf widget is clipped to its own rectangle,
+        so text or borders spilling out of a widget are cut, while the serial painting draws them over the neighbours.
+        It requires a 32 bits display, the widgets are painted on the main thread otherwise.
+
+        Args:
+            threads (int): The number of threads, 1 to paint on the main thread
+        """
+        if self.render_pool is not None:
+            self.render_pool.shutdown()
+            self.render_pool = None
+        self.render_threads = threads
+        if threads>1:
+            self.render_pool = ThreadPoolExecutor(threads, thread_name_prefix="OOPyGame-paint")
+
+    def paint_jobs(self)->list:
+        """Splits the painting of the visible widgets into independent jobs.
+        Jobs must not share pixels, so each leaf is clipped to its rectangle (see setRenderThreads)
+
+        Returns:
+            list: (clip rectangle, widgets painted in order) pairs
+        """
+        def leaves(widget):
+            children = widget.arrange() if isinstance(widget, Layout) else None
+            if children is None:
+                return [widget]
+            return [leaf for child in children for leaf in leaves(child)]
+
+        # Groups of overlapping top level widgets : [bounding rectangle, widgets]
+        groups = []
+        for widget in self.widgets:
+            if not widget.visible:
+                continue
+            rect = pygame.Rect(widget.rect if widget.rect is not None else self.rect)
+            widgets = [widget]
+            for group in [group for group in groups if group[0].colliderect(rect)]:
+                groups.remove(group)
+                rect.union_ip(group[0])
+                widgets = group[1]+widgets
+            # Keep the paint order of the window
+            widgets.sort(key=self.widgets.index)
+            groups.append([rect, widgets])
+
+        jobs = []
+        for rect, widgets in groups:
+            if len(widgets)>1:
+                jobs.append((rect, widgets))
+            else:
+                jobs += [(pygame.Rect(leaf.rect if leaf.rect is not None else rect), [leaf]) for leaf in leaves(widgets[0])]
+        return jobs
+
+    def paint_parallel(self)->bool:
+        """Paints the widgets on the render threads
+
+        Returns:
+            bool: False if the display format does not allow it
+        """
+        screen = self.screen
+        w, h = screen.get_size()
+        if screen.get_bitsize() != 32 or screen.get_pitch() != w*4 or screen.get_masks()[:3] != (0xff0000, 0xff00, 0xff):
+            return False
+        # Balance the threads by painted area
+        threads = self.render_threads
+        buckets = [[] for _ in range(threads)]
+        loads = [0]*threads
+        for job in sorted(self.paint_jobs(), key=lambda job: -job[0].w*job[0].h):
+            i = loads.index(min(loads))
+            buckets[i].append(job)
+            loads[i] += job[0].w*job[0].h
+        # The screen stays locked while its pixels are shared
+        pixels = screen.get_buffer()
+
+        def paint_bucket(jobs):
+            target = pygame.image.frombuffer(pixels, (w, h), "BGRA")
+            target.set_alpha(None)
+            for rect, widgets in jobs:
+                target.set_clip(rect)
+                for widget in widgets:
+                    widget.paint(target)
+
+        try:
+            list(self.render_pool.map(paint_bucket, [bucket for bucket in buckets if len(bucket)>0]))
+        finally:
+            del pixels
+        return True
+
     def build_timer(self, callback_fn, intrval_ms:int=100):
-        timer = Timer(callback_fn, intrval_ms)
+        timer = Timer(callback_fn, intrval_ms, lambda: self.clock())
         self.timers.append(timer)
         return timer
 
     def add_timer(self,  timer:Timer):
+        """Adds a timer, it is switched to the window clock
+        """
+        timer.clock = lambda: self.clock()
+        if timer.started:
+            timer.last_time = timer.clock()
         self.timers.append(timer)
         return timer
 
@@ -441,24 +2160,220 @@ class WindowManager():
         """
         self.widgets.append(widget)
         widget.parent = self
-    
+
+    def removeWidget(self, widget:Widget)->Widget:
+        """Removes a top level widget, its tweens and bindings are dropped
+
+        Returns:
+            Widget: The removed widget
+        """
+        self.widgets.remove(widget)
+        self.forget(widget)
+        widget.parent = None
+        return widget
+
+    def removeChild(self, widget:Widget):
+        self.removeWidget(widget)
+
+    def forget(self, widget:Widget):
+        """Drops every reference the window keeps on a widget and its descendants (tweens, bindings, invalidation)
+        """
+        subtree = widget.subtree()
+        for member in subtree:
+            self.animator.cancelWidget(member)
+            forget_widget(member)
+        self.bindings = [binding for binding in self.bindings if binding.widget not in subtree]
+        self.overlays = [overlay for overlay in self.overlays if overlay.widget not in subtree]
+
+    def animate(self, widget:Widget, attribute, start, end, duration_s:float, easing:str="in_out_quad", delay_s:float=0, on_finished=None)->int:
+        """Animates a widget attribute, see Animator.animate
+
+        Returns:
+            int: The id of the tween
+        """
+        return self.animator.animate(widget, attribute, start, end, duration_s, easing, delay_s, on_finished)
+
+    def bind(self, source, widget:Widget, attribute:str)->Binding:
+        """Binds a widget attribute to a model value, checked once per frame
+
+        Args:
+            source (callable or tuple): A callable returning the model value or a (model, attribute name) pair
+            widget (Widget): The bound widget
+            attribute (str): The bound attribute
+
+        Returns:
+            Binding: The binding
+        """
+        binding = Binding(source, widget, attribute)
+        self.bindings.append(binding)
+        return binding
+
+    def unbind(self, binding:Binding):
+        self.bindings.remove(binding)
+
+    def stream(self, address=("127.0.0.1", 5900), keyframe_interval:int=120, tile_size:int=32, compression_level:int=1):
+        """Streams the window to remote viewers (python -m OOPyGame.streaming host:port) and injects their input events.
+        Only the rectangles changed since the last sent frame are sent, zlib compressed, see FrameStreamServer
+
+        Args:
+            address (tuple or str, optional): A (host, port) pair for TCP or a path for a Unix socket. Defaults to ("127.0.0.1", 5900).
+            keyframe_interval (int, optional): The number of sent frames between two keyframes. Defaults to 120.
+            tile_size (int, optional): The size of the compared tiles. Defaults to 32.
+            compression_level (int, optional): The zlib level. Defaults to 1.
+
+        Returns:
+            FrameStreamServer: The started server, stop it with stopStream
+        """
+        from OOPyGame.streaming import FrameStreamServer
+        server = FrameStreamServer(address, keyframe_interval, tile_size, compression_level).start()
+        self.frame_listeners.append(server.publish)
+        self.input_sources.append(server.poll_events)
+        return server
+
+    def stopStream(self, server):
+        """Stops a stream started with stream
+        """
+        self.frame_listeners.remove(server.publish)
+        self.input_sources.remove(server.poll_events)
+        server.stop()
+
+    def record(self, path:str, format:str="rle", slots:int=8, fps:float=None):
+        """Records the window, frames are encoded and written by a background thread, see ScreenRecorder
+
+        Args:
+            path (str): The file (raw, rle) or the directory (png)
+            format (str, optional): 'raw', 'png' or 'rle' (runs of changed pixels). Defaults to "rle".
+            slots (int, optional): The number of frame buffers, frames are dropped when they are all waiting for the disk. Defaults to 8.
+            fps (float, optional): The maximum recording rate. Defaults to None (every frame).
+
+        Returns:
+            ScreenRecorder: The started recorder, stop it with stopRecording
+        """
+        from OOPyGame.recording import ScreenRecorder
+        recorder = ScreenRecorder(path, format, slots, fps).start()
+        self.frame_listeners.append(recorder.publish)
+        return recorder
+
+    def stopRecording(self, recorder):
+        """Stops a recording started with record, the frames waiting for the disk are written
+        """
+        self.frame_listeners.remove(recorder.publish)
+        recorder.stop()
+
+    def recordInput(self, path:str):
+        """Records the input events of each frame to a binary log, to be replayed with replayInput
+
+        Args:
+            path (str): The log file
+
+        Returns:
+            InputRecorder: The recorder, stop it with stopInputRecording
+        """
+        from OOPyGame.replay import InputRecorder
+        recorder = InputRecorder(path, self.event_source, self.clock, self.mouse_pos)
+        self.event_source = recorder.get
+        return recorder
+
+    def stopInputRecording(self, recorder):
+        self.event_source = recorder.source
+        recorder.close()
+
+    def replayInput(self, path:str, fixed_dt:float=1/60, timings_path:str=None)->dict:
+        """Replays an input log frame by frame and measures the duration of each frame.
+        The window clock (timers, animations) advances by fixed_dt per frame, or by the recorded frame durations
+        if fixed_dt is None, so a replay goes through the same states whatever the speed of the machine.
+
+        Args:
+            path (str): The log written by recordInput
+            fixed_dt (float, optional): The clock step per frame in seconds, None to use the recorded steps. Defaults to 1/60.
+            timings_path (str, optional): A csv file receiving the frame number, events count and duration of each frame. Defaults to None.
+
+        Returns:
+            dict: The frames count, total time and mean, median, 95th percentile and max frame durations
+        """
+        from OOPyGame.replay import InputReplayer, FixedStepClock, timing_summary
+        replayer = InputReplayer(path)
+        clock = FixedStepClock()
+        saved = (self.clock, self.event_source, self.mouse_pos)
+        self.clock = clock
+        self.event_source = replayer.get
+        self.mouse_pos = replayer.mouse_pos
+        for timer in self.timers:
+            if timer.started:
+                timer.last_time = clock()
+        durations = []
+        counts = []
+        try:
+            while not replayer.finished and self.Running:
+                clock.advance(replayer.dt if fixed_dt is None else fixed_dt)
+                start = time.perf_counter()
+                self.process()
+                durations.append(time.perf_counter()-start)
+                counts.append(len(self.events))
+        finally:
+            self.clock, self.event_source, self.mouse_pos = saved
+            for timer in self.timers:
+                if timer.started:
+                    timer.last_time = self.clock()
+        if timings_path is not None:
+            with open(timings_path, "w") as f:
+                f.write("frame,events,ms\n")
+                for i, (count, duration) in enumerate(zip(counts, durations)):
+                    f.write(f"{i},{count},{duration*1000:.3f}\n")
+        return timing_summary(durations)
+
+    def dirty_rects(self)->list:
+        """Returns the rectangles of the widgets invalidated during the current frame
+        """
+        return [widget.rect for widget in dirty_widgets if widget.rect is not None]
+
     def process(self, background_color:tuple = (0,0,0)):
         self.screen.fill(background_color)
-        self.events = pygame.event.get()
+        self.events = self.event_source()
+        for source in self.input_sources:
+            self.events += source()
+        for event in self.events:
+            if event.type in (pygame.MOUSEMOTION, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP):
+                self.mouse_pos = event.pos
         for event in self.events:
             if event.type == pygame.VIDEORESIZE:
                 self.update_rect()
-
-        for widget in self.widgets:
-            if widget.visible:
-                widget.paint(self.screen)
-                widget.handle_events(self.events)
+                self.screen = pygame.display.get_surface()
+                convert_display_surfaces()
+
+        for binding in self.bindings:
+            binding.update()
+        self.animator.update()
+        flush_deliveries()
+        flush_changes()
+
+        # The top layers take the events over them first
+        events = self.events
+        for overlay in reversed(list(self.overlays)):
+            events = overlay.handle_events(events)
+
+        if self.render_pool is not None and self.paint_parallel():
+            for widget in self.widgets:
+                if widget.visible:
+                    widget.handle_events(events)
+        else:
+            for widget in self.widgets:
+                if widget.visible:
+                    widget.paint(self.screen)
+                    widget.handle_events(events)
 
         if self.menu is not None:
             self.menu.paint(self.screen)
-            self.menu.handle_events(self.events)
+            self.menu.handle_events(events)
+        for overlay in self.overlays:
+            overlay.paint(self.screen)
+        for listener in self.frame_listeners:
+            listener(self.screen)
         # Update UI
         pygame.display.update()
+        for widget in dirty_widgets:
+            widget.dirty = False
+        dirty_widgets.clear()
         # Check timerds
         for timer in self.timers:
             timer.process()
@@ -496,46 +2411,685 @@ class Sprite(Widget):
 +
 """
         }
-""",extra_styles={"label":WidgetStyle(align="left")})
+""",extra_styles={"label":WidgetStyle(align="left")})
+
+
+
+# =============================================== Frame slot ==========================================
+
+class FrameSlot():
+    def __init__(self):
+        """Builds a thread safe latest-frame-wins slot based on a triple buffer.
+        Producers publish frames from any thread into a back buffer, the consumer takes the
+        newest published frame. Frames published before the previous one was taken are dropped.
+        Buffers are reused, so no copies pile up when producers are faster than the consumer.
+        """
+        # Serializes producers, held while a frame is copied to the back buffer
+        self.producer_lock = threading.Lock()
+        # Only held while buffers are swapped
+        self.lock = threading.Lock()
+        self.buffers = [None, None, None]
+        self.back = 0
+        self.ready = 1
+        self.front = 2
+        self.fresh = False
+        self.frames_received = 0
+        self.frames_dropped = 0
+        self.frames_displayed = 0
+
+    def publish(self, frame:np.ndarray, copy:bool=True):
+        """Publishes a frame, can be called from any thread
+
+        Args:
+            frame (np.ndarray): The frame
+            copy (bool, optional): If False the slot takes the frame itself, the caller must not modify it afterwards. Defaults to True.
+        """
+        with self.producer_lock:
+            if copy:
+                buffer = self.buffers[self.back]
+                if buffer is None or buffer.shape != frame.shape or buffer.dtype != frame.dtype:
+                    buffer = np.empty_like(frame)
+                    self.buffers[self.back] = buffer
+                np.copyto(buffer, frame)
+            else:
+                self.buffers[self.back] = frame
+            with self.lock:
+                self.frames_received += 1
+                if self.fresh:
+                    self.frames_dropped += 1
+                self.back, self.ready = self.ready, self.back
+                self.fresh = True
+
+    def take(self):
+        """Returns the newest published frame or None if nothing was published since the last call.
+        The returned frame stays valid until the next call
+        """
+        with self.lock:
+            if not self.fresh:
+                return None
+            self.front, self.ready = self.ready, self.front
+            self.fresh = False
+        return self.buffers[self.front]
+
+    @property
+    def stats(self):
+        """The frames received, dropped and displayed counters
+        """
+        with self.lock:
+            return {
+                "received":self.frames_received,
+                "dropped":self.frames_dropped,
+                "displayed":self.frames_displayed
+            }
+
+# =============================================== ImageBox ==========================================
+
+# Default colors of the overlay classes
+overlay_class_colors = ("blue", "orange", "green", "red", "purple", "brown", "pink", "gray", "olive", "cyan")
+# Resolved palettes by tuple of color names
+_palettes = {}
+
+def get_palette(colors:tuple)->list:
+    """Resolves a tuple of color names through get_color, once per tuple
+
+    Args:
+        colors (tuple): The color names, hex values or (r,g,b) tuples
+
+    Returns:
+        list: The (r,g,b) colors
+    """
+    colors = tuple(colors)
+    palette = _palettes.get(colors)
+    if palette is None:
+        palette = [get_color(c) if isinstance(c, str) else tuple(c) for c in colors]
+        _palettes[colors] = palette
+    return palette
+
+def downsample_image(image:np.ndarray, size:tuple, mode:str="area")->np.ndarray:
+    """Reduces an image by the largest integer factors keeping it at least as big as size.
+    Done before building a surface, it avoids converting and uploading pixels that are never shown
+
+    Args:
+        image (np.ndarray): The (height, width, ...) image
+        size (tuple): The (width, height) the image will be displayed at
+        mode (str, optional): 'area' averages each block of pixels, 'decimate' keeps one pixel per block. Defaults to "area".
+
+    Returns:
+        np.ndarray: The reduced image (the image itself if no reduction is possible)
+    """
+    h, w = image.shape[:2]
+    fy = max(h//max(int(size[1]), 1), 1)
+    fx = max(w//max(int(size[0]), 1), 1)
+    if fx == 1 and fy == 1:
+        return image
+    if mode == "decimate":
+        return image[::fy, ::fx]
+    oh, ow = h//fy, w//fx
+    # Summing strided slices is much faster than reducing a (oh, fy, ow, fx) view
+    if np.issubdtype(image.dtype, np.integer):
+        if image.dtype == np.uint8 and fx*fy<=257:
+            accumulator = np.uint16
+        else:
+            accumulator = np.int64 if np.issubdtype(image.dtype, np.signedinteger) else np.uint64
+    else:
+        accumulator = np.float64
+    rows = image[0:oh*fy:fy, :ow*fx].astype(accumulator)
+    for i in range(1, fy):
+        rows += image[i:oh*fy:fy, :ow*fx]
+    blocks = rows[:, 0::fx].copy()
+    for j in range(1, fx):
+        blocks += rows[:, j::fx]
+    if accumulator == np.float64:
+        return blocks/(fx*fy)
+    return (blocks//(fx*fy)).astype(image.dtype)
+
+def fill_pixels(screen:pygame.Surface, indices:np.ndarray, color:tuple):
+    """Sets many pixels to a color at once, the surface must have 1, 2 or 4 bytes per pixel
+
+    Args:
+        screen (pygame.Surface): The surface
+        indices (np.ndarray): The flat indices (y*row_length(screen)+x) of the pixels
+        color (tuple): The color
+    """
+    if len(indices) == 0:
+        return
+    bytesize = screen.get_bytesize()
+    dtype = {1:np.uint8, 2:np.uint16, 4:np.uint32}[bytesize]
+    if screen.get_parent() is not None:
+        # Subsurfaces share the rows of the surface they are cut from
+        x, y = screen.get_abs_offset()
+        color = screen.map_rgb(color)
+        screen = screen.get_abs_parent()
+        indices = indices+y*row_length(screen)+x
+    else:
+        color = screen.map_rgb(color)
+    view = screen.get_view("1")
+    pixels = np.frombuffer(view, dtype)
+    # map_rgb is signed for surfaces with alpha
+    pixels[indices] = color&((1<<8*bytesize)-1)
+    del pixels
+    del view
+
+def row_length(screen:pygame.Surface)->int:
+    """Returns the number of pixels between two rows of a surface buffer
+    """
+    return screen.get_pitch()//screen.get_bytesize()
+
+def _segment_indices(starts:np.ndarray, lengths:np.ndarray, step:int)->np.ndarray:
+    """Returns the indices covered by segments given by their starts and lengths, segment after segment
+    """
+    total = int(lengths.sum())
+    if total == 0:
+        return np.zeros(0, np.int64)
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    return np.repeat(starts-offsets*step, lengths)+np.arange(total)*step
+
+def box_edge_indices(boxes:np.ndarray, width:int, area:pygame.Rect, stride:int)->np.ndarray:
+    """Returns the flat indices of the pixels of box outlines, like pygame.draw.rect with a border width, clipped to an area
+
+    Args:
+        boxes (np.ndarray): (N, 4) integer x, y, width, height boxes
+        width (int): The border width
+        area (pygame.Rect): The drawable area
+        stride (int): The row length of the surface (see row_length)
+
+    Returns:
+        np.ndarray: The indices
+    """
+    x, y, w, h = (boxes[:, i] for i in range(4))
+    # Borders wider than half the box fill it
+    lw = np.minimum(width, (np.minimum(w, h)+1)//2)
+    lines = np.arange(max(width, 1))
+    valid = lines[None, :]<lw[:, None]
+    box = np.concatenate([np.nonzero(valid)[0]]*2)
+    # Rows : the lw top and bottom lines of each box, clipped to the area
+    row_y = np.concatenate([(y[:, None]+lines[None, :])[valid], ((y+h-1)[:, None]-lines[None, :])[valid]])
+    x0 = np.maximum(x[box], area.left)
+    x1 = np.minimum((x+w)[box], area.right)
+    keep = (row_y>=area.top)&(row_y<area.bottom)&(x1>x0)
+    rows = _segment_indices(row_y[keep]*stride+x0[keep], (x1-x0)[keep], 1)
+    # Columns : the lw left and right columns between the rows
+    column_x = np.concatenate([(x[:, None]+lines[None, :])[valid], ((x+w-1)[:, None]-lines[None, :])[valid]])
+    y0 = np.maximum((y+lw)[box], area.top)
+    y1 = np.minimum((y+h-lw)[box], area.bottom)
+    keep = (column_x>=area.left)&(column_x<area.right)&(y1>y0)
+    columns = _segment_indices(y0[keep]*stride+column_x[keep], (y1-y0)[keep], stride)
+    return np.concatenate([rows, columns])
+
+class ImageBox(Widget):
+    def __init__(
+                    self,
+                    image:np.ndarray=None, 
+                    parent=None,
+                    rect:tuple=[0,0,800,600], 
+                    style:str="btn.normal{color:white; background-color:#878787;}\nbtn.hover{color:white; background-color:#a9a9a9};\nbtn.pressed{color:red; background-color:#565656};",
+                    clicked_event_handler=None,
+                    color_key=None,
+                    alpha=100,
+                    downsample:str="area"
+                ):
+        """Builds an image box
+
+        Args:
+            image (np.ndarray, optional): The image to show. Defaults to None.
+            color_key (tuple, optional): A color to be shown transparent. Defaults to None.
+            alpha (int, optional): The opacity in percent. Defaults to 100.
+            downsample (str, optional): How images bigger than the box are reduced before being converted, 'area', 'decimate' or None. Defaults to "area".
+        """
+        Widget.__init__(self,parent,rect, style,extra_styles={"label":WidgetStyle(align="left")})
+        self.color_key = color_key
+        self.alpha = alpha
+        self.downsample = downsample
+        self.frame_slot = FrameSlot()
+        self.source = None
+        self.image_size = None
+        self.overlay = None
+        if image is not None:
+            self.setImage(image)
+        else:
+            self.surface = None
+        register_display_surface(self, "surface")
+
+    def reset(self):
+        Widget.reset(self)
+        # Drop a frame published before the release
+        self.frame_slot.take()
+        self.surface = None
+        self.image_size = None
+        self.overlay = None
+
+    def dispose(self):
+        """Stops the played source and drops the image
+        """
+        self.setSource(None)
+        self.surface = None
+        self.overlay = None
+
+    def setImage(self, image:np.ndarray):
+        size = (int(self.rect[2]), int(self.rect[3]))
+        self.image_size = (image.shape[1], image.shape[0])
+        if self.downsample is not None:
+            image = downsample_image(image, size, self.downsample)
+        self.surface = to_display_format(pygame.pixelcopy.make_surface(np.swapaxes(image,0,1).astype(np.uint8, copy=False)))
+        if self.color_key is not None:
+            self.surface.set_colorkey(self.color_key)
+        if self.alpha<100:
+            self.surface.set_alpha(self.alpha)
+        if self.surface.get_size() != size:
+            self.surface = pygame.transform.scale(self.surface, size)
+
+    def publishFrame(self, image:np.ndarray, copy:bool=True):
+        """Publishes a frame to be shown at the next paint. Unlike setImage, this can be called from any thread.
+        Only the newest frame is converted when painting, older ones are dropped
+
+        Args:
+            image (np.ndarray): The frame
+            copy (bool, optional): If False the frame is not copied and must not be modified afterwards. Defaults to True.
+        """
+        self.frame_slot.publish(image, copy)
+
+    def setSource(self, source:FrameSource):
+        """Plays a frame source (iterator, video file, shared memory ring...) in the image box.
+        The source threads publish the frames straight into the frame slot (like publishFrame)
+
+        Args:
+            source (FrameSource): The source to play or None to stop the current one
+        """
+        if self.source is not None:
+            self.source_stopper.detach()
+            self.source.stop()
+        self.source = source
+        if source is not None:
+            # The threads do not reference the box, a box removed without being released
+            # is collected and its source stopped
+            source.start(self.frame_slot.publish)
+            self.source_stopper = weakref.finalize(self, source.stop_event.set)
+
+    @property
+    def frame_stats(self):
+        """The counters of frames received, dropped and displayed through publishFrame
+        """
+        return self.frame_slot.stats
+
+    def paint(self, screen):
+        frame = self.frame_slot.take()
+        if frame is not None:
+            self.setImage(frame)
+            with self.frame_slot.lock:
+                self.frame_slot.frames_displayed += 1
+        if self.surface is not None:
+            size = (int(self.rect[2]), int(self.rect[3]))
+            if self.surface.get_size() != size:
+                # The box was resized since the image was set
+                self.surface = pygame.transform.scale(self.surface, size)
+            screen.blit(self.surface,(self.rect[0],self.rect[1]))
+        if self.overlay is not None:
+            self.paint_overlay(screen)
+
+    def setOverlay(
+                    self,
+                    rects:np.ndarray=None,
+                    rect_classes:np.ndarray=None,
+                    labels:list=None,
+                    points:np.ndarray=None,
+                    point_classes:np.ndarray=None,
+                    polylines:list=None,
+                    polyline_classes:np.ndarray=None,
+                    class_colors:tuple=overlay_class_colors,
+                    line_width:int=2,
+                    point_radius:int=2
+                ):
+        """Sets shapes to draw over the image, all coordinates being in image pixels.
+        They are mapped to the widget in one vectorized step and drawn in batch at each paint
+
+        Args:
+            rects (np.ndarray, optional): (N, 4) array of x, y, width, height boxes. Defaults to None.
+            rect_classes (np.ndarray, optional): (N,) class index of each box. Defaults to class 0.
+            labels (list, optional): N texts drawn above the boxes. Defaults to None.
+            points (np.ndarray, optional): (M, 2) array of x, y landmarks. Defaults to None.
+            point_classes (np.ndarray, optional): (M,) class index of each point. Defaults to class 0.
+            polylines (list, optional): (K, 2) arrays, or a (P, K, 2) array, of polyline vertices. Defaults to None.
+            polyline_classes (np.ndarray, optional): (P,) class index of each polyline. Defaults to class 0.
+            class_colors (tuple, optional): The colors of the classes. Defaults to overlay_class_colors.
+            line_width (int, optional): The width of boxes and polylines. Defaults to 2.
+            point_radius (int, optional): The radius of the points. Defaults to 2.
+        """
+        def classes(values, n):
+            if values is None:
+                return np.zeros(n, np.int64)
+            return np.asarray(values, np.int64)%len(class_colors)
+        overlay = {
+            "palette":get_palette(class_colors),
+            "line_width":line_width,
+            "point_radius":point_radius,
+            "labels":labels
+        }
+        if rects is not None and len(rects)>0:
+            overlay["rects"] = np.asarray(rects, np.float64).reshape(-1, 4)
+            overlay["rect_classes"] = classes(rect_classes, len(overlay["rects"]))
+        if points is not None and len(points)>0:
+            overlay["points"] = np.asarray(points, np.float64).reshape(-1, 2)
+            overlay["point_classes"] = classes(point_classes, len(overlay["points"]))
+        if polylines is not None and len(polylines)>0:
+            overlay["polylines"] = [np.asarray(line, np.float64).reshape(-1, 2) for line in polylines]
+            overlay["polyline_classes"] = classes(polyline_classes, len(overlay["polylines"]))
+        self.overlay = overlay
+
+    def clearOverlay(self):
+        self.overlay = None
+
+    def paint_overlay(self, screen):
+        """Draws the overlay shapes
 
+        Args:
+            screen ([type]): The screen on which to blit
+        """
+        overlay = self.overlay
+        palette = overlay["palette"]
+        iw, ih = self.image_size if self.image_size is not None else (self.rect[2], self.rect[3])
+        scale = np.array([self.rect[2]/iw, self.rect[3]/ih])
+        origin = np.array([self.rect[0], self.rect[1]])
+        clip = screen.get_clip()
+        area = clip.clip(self.rect)
+        screen.set_clip(area)
+
+        if "rects" in overlay:
+            rects = overlay["rects"]
+            boxes = np.empty((len(rects), 4), np.int64)
+            boxes[:, :2] = rects[:, :2]*scale+origin
+            boxes[:, 2:] = np.maximum(rects[:, 2:]*scale, 1)
+            rect_classes = overlay["rect_classes"]
+            width = overlay["line_width"]
+            if screen.get_bytesize() in (1, 2, 4):
+                # Outlines are drawn class by class, all the pixels of a class at once
+                stride = row_length(screen)
+                for c in np.unique(rect_classes).tolist():
+                    fill_pixels(screen, box_edge_indices(boxes[rect_classes == c], width, area, stride), palette[c])
+            else:
+                for box, c in zip(boxes.tolist(), rect_classes.tolist()):
+                    pygame.draw.rect(screen, palette[c], box, width)
+            if overlay["labels"] is not None:
+                # Labels change every frame, the glyph atlas draws them without filling the line cache
+                font = self.styles["label"].font
+                height = font.get_height()
+                for label, (x, y), c in zip(overlay["labels"], boxes[:, :2].tolist(), rect_classes.tolist()):
+                    get_glyph_atlas(font, palette[c]).draw(screen, str(label), (x, y-height))
+
+        if "polylines" in overlay:
+            width = overlay["line_width"]
+            for line, c in zip(overlay["polylines"], overlay["polyline_classes"].tolist()):
+                if len(line)>1:
+                    pygame.draw.lines(screen, palette[c], False, (line*scale+origin).astype(np.int64).tolist(), width)
+
+        if "points" in overlay:
+            r = overlay["point_radius"]
+            dy, dx = np.mgrid[-r:r+1, -r:r+1]
+            disk = np.stack([dx[dx**2+dy**2<=r*r], dy[dx**2+dy**2<=r*r]], axis=1)
+            centers = (overlay["points"]*scale+origin).astype(np.int64)
+            pixels = (centers[:, None, :]+disk[None, :, :]).reshape(-1, 2)
+            classes = np.repeat(overlay["point_classes"], len(disk))
+            inside = (pixels[:, 0]>=area.left)&(pixels[:, 0]<area.right)&(pixels[:, 1]>=area.top)&(pixels[:, 1]<area.bottom)
+            pixels = pixels[inside]
+            classes = classes[inside]
+            if screen.get_bytesize() in (1, 2, 4):
+                indices = pixels[:, 1]*row_length(screen)+pixels[:, 0]
+                for c in np.unique(classes).tolist():
+                    fill_pixels(screen, indices[classes == c], palette[c])
+            else:
+                for (x, y), c in zip(pixels.tolist(), classes.tolist()):
+                    screen.set_at((x, y), palette[c])
 
+        screen.set_clip(clip)
 
-# =============================================== ImageBox ==========================================
+# =============================================== TiledImageView ==========================================
 
-class ImageBox(Widget):
+class TiledImageView(Widget):
     def __init__(
                     self,
-                    image:np.ndarray=None, 
+                    image=None,
                     parent=None,
-                    rect:tuple=[0,0,800,600], 
-                    style:str="btn.normal{color:white; background-color:#878787;}\nbtn.hover{color:white; background-color:#a9a9a9};\nbtn.pressed{color:red; background-color:#565656};",
-                    clicked_event_handler=None,
-                    color_key=None,
-                    alpha=100
+                    rect:tuple=[0,0,800,600],
+                    style:str="",
+                    tile_size:int=256,
+                    max_tiles:int=512,
+                    value_range:tuple=None,
+                    zoom_step:float=1.25,
+                    min_zoom:float=None,
+                    max_zoom:float=32.0,
+                    max_scaled_pixels:int=16_000_000
                 ):
-        Widget.__init__(self,parent,rect, style,extra_styles={"label":WidgetStyle(align="left")})
-        self.color_key = color_key
-        self.alpha = alpha
+        """Builds a pan/zoom viewer for images too big to be converted at once (gigapixel microscopy, satellite imagery...).
+        The image is read lazily from a (memory mapped) array and split in tiles. Downsampled levels of a pyramid
+        are computed tile by tile when first needed, and only the tiles intersecting the viewport at the current
+        zoom are converted to surfaces, which are kept in a least recently used cache.
+        Drag with the left mouse button to pan, use the wheel to zoom.
+
+        Args:
+            image (np.ndarray or str, optional): A (height, width[, channels]) array, np.memmap or path to a .npy file. Defaults to None.
+            tile_size (int, optional): The size of the tiles in pixels. Defaults to 256.
+            max_tiles (int, optional): The maximum number of tile surfaces kept in cache. Defaults to 512.
+            value_range (tuple, optional): The (low, high) values mapped to black and white for non 8 bits images. Defaults to None.
+            zoom_step (float, optional): The zoom factor applied for each wheel step. Defaults to 1.25.
+            min_zoom (float, optional): The smallest zoom. Defaults to None (half the zoom fitting the image in the view).
+            max_zoom (float, optional): The largest zoom. Defaults to 32.
+            max_scaled_pixels (int, optional): The maximum total number of pixels of the scaled tiles kept in cache. Defaults to 16 000 000.
+        """
+        Widget.__init__(self,parent,rect, style,extra_styles={"tiledimageview":WidgetStyle(bg_color=get_color("black"))})
+        self.tile_size = tile_size
+        self.value_range = value_range
+        self.zoom_step = zoom_step
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.tiles = SurfaceCache(max_tiles)
+        # Only the visible part of a tile is scaled, so entries are at most the size of the view
+        self.scaled_tiles = SurfaceCache(max_tiles, max_scaled_pixels)
+        # Pyramid tiles above level 0, kept to build the upper levels
+        self.level_tiles = LRUCache(4*max_tiles)
+        self.image = None
+        self.zoom = 1.0
+        self.offset = [0.0, 0.0]
+        self.dragging = False
         if image is not None:
             self.setImage(image)
-        else:
-            self.surface = None
 
-    def setImage(self, image:np.ndarray):
-        self.surface = pygame.pixelcopy.make_surface(np.swapaxes(image,0,1).astype(np.uint8))
-        if self.color_key is not None:
-            self.surface.set_colorkey(self.color_key)
-        if self.alpha<100:
-            self.surface.set_alpha(self.alpha)
-        self.surface = pygame.transform.scale(self.surface, (self.rect[2], self.rect[3]))
+    def reset(self):
+        Widget.reset(self)
+        self.dragging = False
+
+    def dispose(self):
+        """Drops the image and the cached tiles
+        """
+        self.image = None
+        self.tiles.clear()
+        self.scaled_tiles.clear()
+        self.level_tiles.clear()
+
+    def setImage(self, image):
+        """Sets the image to view and fits it in the view
+
+        Args:
+            image (np.ndarray or str): A (height, width[, channels]) array, np.memmap or path to a .npy file
+        """
+        if isinstance(image, str):
+            image = np.load(image, mmap_mode="r")
+        self.image = image
+        h, w = image.shape[:2]
+        self.levels = 1
+        while max(h, w)>self.tile_size:
+            h, w = (h+1)//2, (w+1)//2
+            self.levels += 1
+        self.tiles.clear()
+        self.scaled_tiles.clear()
+        self.level_tiles.clear()
+        self.fitToView()
+
+    def fitToView(self):
+        """Zooms and pans so that the whole image is visible
+        """
+        if self.image is None or self.rect is None:
+            return
+        h, w = self.image.shape[:2]
+        self.zoom = self.clamp_zoom(min(self.rect[2]/w, self.rect[3]/h))
+        self.offset = [(w-self.rect[2]/self.zoom)/2, (h-self.rect[3]/self.zoom)/2]
+
+    def zoom_range(self)->tuple:
+        """Returns the (smallest, largest) allowed zoom
+        """
+        min_zoom = self.min_zoom
+        if min_zoom is None:
+            if self.image is None or self.rect is None:
+                min_zoom = 1e-3
+            else:
+                h, w = self.image.shape[:2]
+                min_zoom = min(self.rect[2]/w, self.rect[3]/h)/2
+        return min_zoom, max(min_zoom, self.max_zoom)
+
+    def clamp_zoom(self, zoom:float)->float:
+        min_zoom, max_zoom = self.zoom_range()
+        return min(max(zoom, min_zoom), max_zoom)
+
+    def setZoom(self, zoom:float, center:tuple=None):
+        """Sets the zoom (screen pixels per image pixel) keeping a screen point fixed
+
+        Args:
+            zoom (float): The new zoom, clamped to [min_zoom, max_zoom]
+            center (tuple, optional): The screen point to keep fixed. Defaults to the center of the view.
+        """
+        zoom = self.clamp_zoom(zoom)
+        if center is None:
+            center = (self.rect[0]+self.rect[2]/2, self.rect[1]+self.rect[3]/2)
+        # Image point under the center
+        ix = self.offset[0]+(center[0]-self.rect[0])/self.zoom
+        iy = self.offset[1]+(center[1]-self.rect[1])/self.zoom
+        self.zoom = zoom
+        self.offset = [ix-(center[0]-self.rect[0])/zoom, iy-(center[1]-self.rect[1])/zoom]
+
+    def level_tile(self, level:int, tx:int, ty:int):
+        """Returns the pixels of a tile of a pyramid level, computing it from the level below if needed
+        """
+        t = self.tile_size
+        if level == 0:
+            return np.asarray(self.image[ty*t:(ty+1)*t, tx*t:(tx+1)*t])
+        key = (level, tx, ty)
+        tile = self.level_tiles.get(key)
+        if tile is not None:
+            return tile
+        h, w = self.image.shape[:2]
+        # Size of the level below, the children tiles must exist there
+        lh, lw = h, w
+        for _ in range(level-1):
+            lh, lw = (lh+1)//2, (lw+1)//2
+        children = [
+            [self.level_tile(level-1, cx, cy) for cx in (2*tx, 2*tx+1) if cx*t<lw]
+            for cy in (2*ty, 2*ty+1) if cy*t<lh
+        ]
+        block = np.concatenate([np.concatenate(row, axis=1) for row in children], axis=0)
+        # Pad odd sizes by repeating the last row/column, then average 2x2 blocks
+        if block.shape[0]%2 == 1:
+            block = np.concatenate([block, block[-1:]], axis=0)
+        if block.shape[1]%2 == 1:
+            block = np.concatenate([block, block[:, -1:]], axis=1)
+        accumulator = np.float64 if np.issubdtype(block.dtype, np.floating) else np.int64
+        tile = block[0::2, 0::2].astype(accumulator)
+        tile += block[1::2, 0::2]
+        tile += block[0::2, 1::2]
+        tile += block[1::2, 1::2]
+        tile = (tile/4 if accumulator == np.float64 else tile//4).astype(block.dtype)
+        return self.level_tiles.put(key, tile)
+
+    def tile_surface(self, level:int, tx:int, ty:int):
+        """Returns the surface of a tile at its native resolution
+        """
+        key = (level, tx, ty)
+        surface = self.tiles.get(key)
+        if surface is None:
+            pixels = self.level_tile(level, tx, ty)
+            if self.value_range is not None:
+                low, high = self.value_range
+                pixels = np.clip((pixels.astype(np.float32)-low)*(255/(high-low)), 0, 255)
+            pixels = pixels.astype(np.uint8, copy=False)
+            if pixels.ndim == 2:
+                pixels = np.repeat(pixels[:, :, None], 3, axis=2)
+            surface = self.tiles.put(key, to_display_format(pygame.pixelcopy.make_surface(np.swapaxes(pixels[:, :, :3], 0, 1))))
+        return surface
 
     def paint(self, screen):
-        if self.surface is not None:
-            screen.blit(pygame.transform.scale(self.surface, (self.rect[2], self.rect[3])),(self.rect[0],self.rect[1]))
+        style = self.styles["tiledimageview"]
+        if style.img is None:
+            self.draw_rect(screen, style)
+        else:
+            self.draw_image(screen, style)
+        if self.image is None:
+            return
+        h, w = self.image.shape[:2]
+        level = min(max(0, int(np.floor(np.log2(1/self.zoom)))), self.levels-1)
+        span = self.tile_size*2**level # level 0 pixels covered by a tile
+        x0, y0 = self.offset
+        x1 = x0+self.rect[2]/self.zoom
+        y1 = y0+self.rect[3]/self.zoom
+        clip = screen.get_clip()
+        view = clip.clip(self.rect)
+        screen.set_clip(view)
+        blits = []
+        for ty in range(max(0, int(y0//span)), min(int(np.ceil(min(y1, h)/span)), (h+span-1)//span)):
+            for tx in range(max(0, int(x0//span)), min(int(np.ceil(min(x1, w)/span)), (w+span-1)//span)):
+                # Round both edges so that neighbouring tiles abut exactly
+                left = int(round(self.rect[0]+(tx*span-x0)*self.zoom))
+                top = int(round(self.rect[1]+(ty*span-y0)*self.zoom))
+                right = int(round(self.rect[0]+(min((tx+1)*span, w)-x0)*self.zoom))
+                bottom = int(round(self.rect[1]+(min((ty+1)*span, h)-y0)*self.zoom))
+                if right<=left or bottom<=top:
+                    continue
+                tile = self.tile_surface(level, tx, ty)
+                tw, th = tile.get_size()
+                scale_x = (right-left)/tw
+                scale_y = (bottom-top)/th
+                # Only the source pixels covering the view are scaled
+                sx0 = max(0, int((view.left-left)/scale_x))
+                sy0 = max(0, int((view.top-top)/scale_y))
+                sx1 = min(tw, int(np.ceil((view.right-left)/scale_x)))
+                sy1 = min(th, int(np.ceil((view.bottom-top)/scale_y)))
+                if sx1<=sx0 or sy1<=sy0:
+                    continue
+                dl = left+int(round(sx0*scale_x))
+                dt = top+int(round(sy0*scale_y))
+                size = (left+int(round(sx1*scale_x))-dl, top+int(round(sy1*scale_y))-dt)
+                if size[0]<=0 or size[1]<=0:
+                    continue
+                key = (level, tx, ty, right-left, bottom-top, sx0, sy0, sx1, sy1)
+                surface = self.scaled_tiles.get(key)
+                if surface is None:
+                    surface = tile if (sx0, sy0, sx1, sy1) == (0, 0, tw, th) else tile.subsurface((sx0, sy0, sx1-sx0, sy1-sy0))
+                    if surface.get_size() != size:
+                        surface = pygame.transform.scale(surface, size)
+                    self.scaled_tiles.put(key, surface)
+                blits.append((surface, (dl, dt)))
+        screen.blits(blits, False)
+        screen.set_clip(clip)
+
+    def handle_events(self, events):
+        """Handles the events
+
+        """
+        for event in events:
+            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                self.dragging = is_point_inside_rect(event.pos,self.rect_left_top_right_bottom)
+            elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
+                self.dragging = False
+            elif event.type == pygame.MOUSEMOTION:
+                if self.dragging:
+                    self.offset[0] -= event.rel[0]/self.zoom
+                    self.offset[1] -= event.rel[1]/self.zoom
+            elif event.type == pygame.MOUSEWHEEL:
+                pos = self.mouse_position()
+                if is_point_inside_rect(pos,self.rect_left_top_right_bottom):
+                    self.setZoom(self.zoom*self.zoom_step**event.y, pos)
 
 # =============================================== Label ==========================================
 
 class Label(Widget):
+    text = ObservableProperty("")
+
     def __init__(
                     self,
                     text, 
@@ -545,9 +3099,11 @@ class Label(Widget):
                     left_margin:int=0,
                     right_margin:int=0,
                     style:str="",
-                    clicked_event_handler=None
+                    clicked_event_handler=None,
+                    wrap:bool=False,
+                    overflow:str="visible"
                 ):
-        Widget.__init__(self, parent, rect, style,extra_styles={"label":WidgetStyle(align=align,left_margin=left_margin,right_margin=right_margin)})
+        Widget.__init__(self, parent, rect, style,extra_styles={"label":WidgetStyle(align=align,left_margin=left_margin,right_margin=right_margin,wrap=wrap,overflow=overflow)})
         self.text = text
         self.hovered=False
         self.pressed=False
@@ -573,7 +3129,7 @@ class Label(Widget):
         if style.img is None:
             self.draw_rect(screen, style)
         else:
-            screen.blit(pygame.transform.scale(style.img, (self.rect[2], self.rect[3])), (self.rect[0],self.rect[1]))
+            self.draw_image(screen, style)
 
         self.blit_text(self.text,style, screen)
 
@@ -581,6 +3137,8 @@ class Label(Widget):
 # =============================================== Label ==========================================
 
 class TextBox(Widget):
+    text = ObservableProperty("")
+
     def __init__(
                     self,
                     text, 
@@ -603,6 +3161,14 @@ class TextBox(Widget):
         self.lost_focus_event_handler = lost_focus_event_handler
         self.setStyleSheet(style)
 
+    def reset(self):
+        Widget.reset(self)
+        self.hovered=False
+        self.pressed=False
+        self.focused=False
+        self.clicked_event_handler = None
+        self.lost_focus_event_handler = None
+
     def setText(self,text:str)->None:
         """Changes the text to be displayed inside the label
 
@@ -672,18 +3238,30 @@ class TextBox(Widget):
         if style.img is None:
             self.draw_rect(screen, style)
         else:
-            screen.blit(pygame.transform.scale(style.img, (self.rect[2], self.rect[3])), (self.rect[0],self.rect[1]))
+            self.draw_image(screen, style)
 
         self.blit_text(self.text,style, screen)
 
         # Blit the cursor
         if self.focused:
-            x = style.font.size(self.text[0:self.cursorPos])[0]
+            with font_lock:
+                x = style.font.size(self.text[0:self.cursorPos])[0]
             pygame.draw.line(screen,style.text_color,(self.rect[0]+x,self.rect[1]+5),(self.rect[0]+x,self.rect[1]+self.rect[3]-5),2)
         
 # =============================================== Button ==========================================
 
+# Default button styles, shared by all the buttons (the theme never modifies them)
+button_styles = {
+    "btn.normal":WidgetStyle(border_radius=4,text_color=(255,255,255), bg_color=get_color("#878787")),
+    "btn.hover":WidgetStyle(border_radius=4,text_color=(255,255,255), bg_color=get_color("#a9a9a9")),
+    "btn.pressed":WidgetStyle(border_radius=4,text_color=(255,255,255), bg_color=get_color("#565656")),
+}
+# Menus and actions use square buttons
+menu_button_styles = {name:replace(style, border_radius=0) for name, style in button_styles.items()}
+
 class Button(Widget):
+    text = ObservableProperty("")
+
     def __init__(
                     self,
                     text,
@@ -700,11 +3278,7 @@ class Button(Widget):
                         parent,
                         rect,
                         style,
-                        self.merge_two_dicts({
-                            "btn.normal":WidgetStyle(border_radius=4,text_color=(255,255,255), bg_color=get_color("#878787")),
-                            "btn.hover":WidgetStyle(border_radius=4,text_color=(255,255,255), bg_color=get_color("#a9a9a9")),
-                            "btn.pressed":WidgetStyle(border_radius=4,text_color=(255,255,255), bg_color=get_color("#565656")),
-                        }, extra_styles)
+                        self.merge_two_dicts(button_styles, extra_styles)
                         )
 
                                 
@@ -719,6 +3293,14 @@ class Button(Widget):
         self.lost_focus_event_handler = lost_focus_event_handler
 
 
+    def reset(self):
+        Widget.reset(self)
+        self.hovered=False
+        self.pressed=False
+        self.toggled=False
+        self.clicked_event_handler = None
+        self.lost_focus_event_handler = None
+
     def setText(self,text:str)->None:
         """Changes the text to be displayed inside the label
 
@@ -744,7 +3326,7 @@ class Button(Widget):
         if style.img is None:
             self.draw_rect(screen, style)
         else:
-            screen.blit(pygame.transform.scale(style.img, (self.rect[2], self.rect[3])), (self.rect[0],self.rect[1]))
+            self.draw_image(screen, style)
         self.blit_text(self.text, style, screen)
 
     def handle_events(self, events):
@@ -781,6 +3363,8 @@ class Button(Widget):
 # =============================================== ProgressBar ==========================================
 
 class ProgressBar(Widget):
+    value = ObservableProperty(0)
+
     def __init__(
                 self, 
                 parent=None,
@@ -821,21 +3405,21 @@ class ProgressBar(Widget):
         if outer_style.img is None:
             self.draw_rect(screen, outer_style)
         else:
-            screen.blit(pygame.transform.scale(outer_style.img, (self.rect[2], self.rect[3])), (self.rect[0],self.rect[1]))
+            self.draw_image(screen, outer_style)
         
         if inner_style.img is None:
             self.draw_rect(screen, inner_style)
-            if inner_style.bg_color is not None:
-                pygame.draw.rect(screen,inner_style.bg_color,[self.rect[0], self.rect[1], self.rect[2]*self.value, self.rect[3]])
-            if inner_style.border_size>0:
-                pygame.draw.rect(screen,inner_style.border_color,[self.rect[0], self.rect[1], self.rect[2]*self.value, self.rect[3]], inner_style.border_size)
+            # The fill width changes with the value, keep it out of the cache
+            self.draw_rect(screen, inner_style, [self.rect[0], self.rect[1], self.rect[2]*self.value, self.rect[3]], cache=False)
 
         else:
-            screen.blit(pygame.transform.scale(inner_style.img, (self.rect[2], self.rect[3])), (self.rect[0],self.rect[1]))
+            self.draw_image(screen, inner_style)
         
 
 
 class Slider(Widget):
+    value = ObservableProperty(0)
+
     def __init__(
                 self, 
                 parent=None,
@@ -844,7 +3428,10 @@ class Slider(Widget):
                 value=0,
                 orientation=Horizontal,
                 valueChanged_callback=None,
-                mouse_down_callback=None
+                mouse_down_callback=None,
+                delivery:str="immediate",
+                delivery_ms:float=100,
+                released_callback=None
             ):
         """Creates a Slider instance.
 
@@ -855,12 +3442,24 @@ class Slider(Widget):
             orientation : The orientation of the Slider.
 
             valueChanged_callback : A callback function that is called when the value of the slider changes
+            delivery (str, optional): When valueChanged_callback is called while dragging :
+                'immediate' at each mouse motion, 'frame' once per frame with the latest value,
+                'debounce' once the value did not change for delivery_ms, 'rate' at most once every delivery_ms.
+                Defaults to "immediate".
+            delivery_ms (float, optional): The delay used by the 'debounce' and 'rate' deliveries. Defaults to 100.
+            released_callback : A callback function called with the final value when the selector is released or the bar clicked
         """
         self.value = 0
         self.orientation = orientation
         self.hovered=False
         self.selector_hovered=False
         self.pressed=False
+        self.delivery = delivery
+        self.delivery_ms = delivery_ms
+        self.released_callback = released_callback
+        self.pending_value = None
+        self.last_change_time = 0
+        self.last_delivery_time = 0
 
         if self.orientation == Horizontal:
             super().__init__(
@@ -891,6 +3490,21 @@ class Slider(Widget):
         self.valueChanged_callback = valueChanged_callback
         self.mouse_down_callback = mouse_down_callback
 
+    def reset(self):
+        Widget.reset(self)
+        self.hovered=False
+        self.selector_hovered=False
+        self.pressed=False
+        self.pending_value = None
+        pending_deliveries.discard(self)
+        self.last_change_time = 0
+        self.last_delivery_time = 0
+        self.released_callback = None
+        self.mouse_down_callback = None
+        self.valueChanged_callback = None
+        self.delivery = "immediate"
+        self.delivery_ms = 100
+
     def setValue(self, value:float):
         """Sets the current value of the slider between 0 and 1
 
@@ -991,31 +3605,65 @@ class Slider(Widget):
             if bar_style.img is None:
                 self.draw_rect(screen, bar_style,self.bar_rect)
             else:
-                screen.blit(pygame.transform.scale(bar_style.img, (self.bar_rect[2], self.bar_rect[3])), (self.bar_rect[0], self.bar_rect[1]))
+                self.draw_image(screen, bar_style, self.bar_rect)
             
             # Draw the bar ---------------------------------------------->
             if selector_style.img is None:
-                if selector_style.bg_color is not None:
-                    pygame.draw.rect(screen,selector_style.bg_color,self.slider_rect, border_radius = selector_style.border_radius)
-                if selector_style.border_size>0:
-                    pygame.draw.rect(screen,selector_style.border_color,self.slider_rect, selector_style.border_size, border_radius = selector_style.border_radius)
+                self.draw_rect(screen, selector_style, self.slider_rect)
             else:
-                screen.blit(pygame.transform.scale(selector_style.img, (self.rect[2], self.rect[3])), (self.rect[0],self.rect[1]))
+                self.draw_image(screen, selector_style)
         else:
             vc = self.rect[0]+self.rect[2]//2
             rect = [vc-bar_style.width,self.rect[1], bar_style.width+2,self.rect[3]]
             if bar_style.img is None:
                 self.draw_rect(screen, bar_style,[self.rect[0]+5,self.rect[1],self.rect[2]-10,self.rect[3]])
             else:
-                screen.blit(pygame.transform.scale(bar_style.img, (self.rect[2], self.rect[3])), (self.rect[0],self.rect[1]))
+                self.draw_image(screen, bar_style)
             
             if selector_style.img is None:
-                if selector_style.bg_color is not None:
-                    pygame.draw.rect(screen,selector_style.bg_color,self.slider_rect, border_radius = selector_style.border_radius)
-                if selector_style.border_size>0:
-                    pygame.draw.rect(screen,selector_style.border_color,self.slider_rect, selector_style.border_size, border_radius = selector_style.border_radius)
+                self.draw_rect(screen, selector_style, self.slider_rect)
             else:
-                screen.blit(pygame.transform.scale(selector_style.img, (self.rect[2], self.rect[3])), (self.rect[0],self.rect[1]))
+                self.draw_image(screen, selector_style)
+
+    def valueFromPos(self, pos:tuple)->float:
+        """Returns the value corresponding to a mouse position, along the slider axis
+        """
+        if self.orientation == Horizontal:
+            return min(max(0,(pos[0]-self.rect[0])/self.rect[2]),1)
+        return min(max(0,(pos[1]-self.rect[1])/self.rect[3]),1)
+
+    def changeValue(self, value:float):
+        """Sets the value following a user action and delivers it according to the delivery policy
+        """
+        self.setValue(value)
+        if self.delivery == "immediate":
+            self.deliver(value)
+        else:
+            self.pending_value = value
+            self.last_change_time = self.now()
+            pending_deliveries.add(self)
+
+    def deliver(self, value:float):
+        self.pending_value = None
+        pending_deliveries.discard(self)
+        self.last_delivery_time = self.now()
+        if self.valueChanged_callback is not None:
+            self.valueChanged_callback(value)
+
+    def flush(self):
+        """Delivers the pending value if the delivery policy allows it now.
+        Called every frame by the window while a value is pending, see flush_deliveries
+        """
+        if self.pending_value is None:
+            return
+        now = self.now()
+        if self.delivery == "debounce":
+            if (now-self.last_change_time)*1000<self.delivery_ms:
+                return
+        elif self.delivery == "rate":
+            if (now-self.last_delivery_time)*1000<self.delivery_ms:
+                return
+        self.deliver(self.pending_value)
 
     def handle_events(self, events):
         """Handles the events
@@ -1026,35 +3674,40 @@ class Slider(Widget):
                 self.selector_hovered = is_point_inside_rect(event.pos,self.slider_rect_left_top_right_bottom)
                 self.hovered = is_point_inside_rect(event.pos,self.rect_left_top_right_bottom)
                 if self.pressed:
-                    self.value = min(max(0,(event.pos[0]-self.rect[0])/self.rect[2]),1)
-                    if self.valueChanged_callback is not None:
-                        self.valueChanged_callback(self.value)    
+                    self.changeValue(self.valueFromPos(event.pos))
 
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 self.selector_hovered = is_point_inside_rect(event.pos,self.slider_rect_left_top_right_bottom)
                 self.hovered = is_point_inside_rect(event.pos,self.rect_left_top_right_bottom)
                 if self.hovered == True and self.selector_hovered == False:
-                    self.value = min(max(0,(event.pos[0]-self.rect[0])/self.rect[2]),1)
-                    if self.valueChanged_callback is not None:
-                        self.valueChanged_callback(self.value)    
+                    self.changeValue(self.valueFromPos(event.pos))
+                    if self.pending_value is not None:
+                        self.deliver(self.pending_value)
+                    if self.released_callback is not None:
+                        self.released_callback(self.value)
                 elif self.selector_hovered:
                     self.pressed = True
 
-
-
             elif event.type == pygame.MOUSEBUTTONUP:
                 self.selector_hovered = is_point_inside_rect(event.pos,self.slider_rect_left_top_right_bottom)
                 self.hovered = is_point_inside_rect(event.pos,self.rect_left_top_right_bottom)
-                if self.selector_hovered:
-                    if self.pressed:
-                        self.value = min(max(0,(event.pos[0]-self.rect[0])/self.rect[2]),1)
-                        if self.valueChanged_callback is not None:
-                            self.valueChanged_callback(self.value)    
+                if self.pressed:
+                    if self.selector_hovered:
+                        self.changeValue(self.valueFromPos(event.pos))
+                    # The final value is always delivered on release
+                    if self.pending_value is not None:
+                        self.deliver(self.pending_value)
+                    if self.released_callback is not None:
+                        self.released_callback(self.value)
                 self.pressed = False
+        # Called once per frame, even without events, so that delayed values get delivered
+        self.flush()
 
 
 # =============================================== List ==========================================
 class List(Widget):
+    list = ObservableProperty(None)
+
     def __init__(
                 self,
                 parent:WindowManager=None,
@@ -1081,6 +3734,17 @@ class List(Widget):
         self.last_mouse_y_pos = 0
         self.scrolling = False
 
+    def reset(self):
+        Widget.reset(self)
+        self.pressed = False
+        self.hovered = False
+        self.hovered_item_index = 0
+        self.current_item = 0
+        self.scroll_value = 0
+        self.first_visible = 0
+        self.selection_changed_callback = None
+        self.scrolling = False
+
     def paint(self, screen):
         """Paints the button
 
@@ -1097,7 +3761,7 @@ class List(Widget):
         if outer_style.img is None:
             self.draw_rect(screen, outer_style,[self.rect[0],self.rect[1]+5,self.rect[2],self.rect[3]-10])
         else:
-            screen.blit(pygame.transform.scale(outer_style.img, (self.rect[2], self.rect[3])), (self.rect[0],self.rect[1]))
+            self.draw_image(screen, outer_style)
         
         y_pos = self.rect[1]
         x_pos = self.rect[0]
@@ -1161,6 +3825,664 @@ class List(Widget):
                         self.selection_changed_callback(self.value)    
                     self.scrolling = False
 
+# =============================================== Table ==========================================
+
+class Table(Widget):
+    def __init__(
+                    self,
+                    parent=None,
+                    rect:tuple=[0,0,400,300],
+                    style:str="",
+                    columns:dict=None,
+                    formats:dict=None,
+                    column_widths:list=None,
+                    max_cached_rows:int=256,
+                    selection_changed_callback=None
+                ):
+        """Builds a virtualized table.
+        The model is columnar : a dict of numpy arrays, or a column provider callback for data that does not fit in memory.
+        Only the visible rows are formatted and rendered, each rendered row is kept in a cache, sorting is
+        done through an argsort permutation (the data is never copied) and scrolling moves the already
+        rendered rows and only renders the exposed ones.
+
+        Args:
+            columns (dict, optional): The data, column name -> 1D array, all of the same length. Defaults to None.
+            formats (dict, optional): column name -> format string (like "{:.2f}") or callable returning a str. Defaults to str.
+            column_widths (list, optional): The widths of the columns in pixels. Defaults to equal widths.
+            max_cached_rows (int, optional): The number of rendered rows kept in cache. Defaults to 256.
+            selection_changed_callback (callable, optional): Called with the model index of the selected row. Defaults to None.
+        """
+        Widget.__init__(self, parent, rect, style, extra_styles={
+            "table":WidgetStyle(bg_color=get_color("white")),
+            "table.header":WidgetStyle(height=22, bg_color=get_color("#878787"), text_color=get_color("white"), align="left", left_margin=4),
+            "table.row":WidgetStyle(height=20, bg_color=get_color("white"), align="left", left_margin=4),
+            "table.row.alternate":WidgetStyle(height=20, bg_color=get_color("#efefef"), align="left", left_margin=4),
+            "table.row.selected":WidgetStyle(height=20, bg_color=get_color("#a9a9a9"), align="left", left_margin=4),
+        })
+        self.formats = {} if formats is None else formats
+        self.column_widths = column_widths
+        self.rows = SurfaceCache(max_cached_rows)
+        self.selection_changed_callback = selection_changed_callback
+        self.first_row = 0
+        self.selected_row = None
+        self.sort_column = None
+        self.sort_descending = False
+        self.canvas = None
+        self.canvas_state = None
+        self.setData({} if columns is None else columns)
+
+    def reset(self):
+        Widget.reset(self)
+        self.selection_changed_callback = None
+        self.first_row = 0
+        self.selected_row = None
+        self.canvas_state = None
+
+    def dispose(self):
+        self.rows.clear()
+        self.canvas = None
+        self.canvas_state = None
+
+    def setData(self, columns:dict):
+        """Sets the data as a dict of column name -> 1D array
+
+        Args:
+            columns (dict): The columns, all of the same length
+        """
+        names = list(columns)
+        row_count = len(columns[names[0]]) if len(names)>0 else 0
+        self.setColumnProvider(names, row_count, lambda name, rows: columns[name][rows])
+
+    def setColumnProvider(self, names:list, row_count:int, provider):
+        """Sets the data as a callback, for data that is computed or paged on demand
+
+        Args:
+            names (list): The names of the columns
+            row_count (int): The number of rows
+            provider (callable): provider(name, rows) returns the values of column name at rows (a slice or an index array)
+        """
+        self.names = list(names)
+        self.row_count = row_count
+        self.provider = provider
+        self.order = None
+        self.sort_column = None
+        self.first_row = 0
+        self.selected_row = None
+        self.invalidateRows()
+
+    def invalidateRows(self):
+        """Drops the rendered rows and repaints the table, to be called when the data changes in place
+        """
+        self.rows.clear()
+        self.canvas_state = None
+        self.invalidate()
+
+    def sortBy(self, name:str, descending:bool=False):
+        """Sorts the rows by a column. Only a permutation of row indices is stored, None unsorts
+
+        Args:
+            name (str): The column
+            descending (bool, optional): Sort in descending order. Defaults to False.
+        """
+        self.sort_column = name
+        self.sort_descending = descending
+        if name is None:
+            self.order = None
+        else:
+            order = np.argsort(self.provider(name, slice(0, self.row_count)), kind="stable")
+            self.order = order[::-1] if descending else order
+        self.invalidateRows()
+
+    def widths(self):
+        if self.column_widths is not None:
+            return list(self.column_widths)
+        n = max(len(self.names), 1)
+        return [int(self.rect[2])//n]*n
+
+    @property
+    def visible_rows(self):
+        body = int(self.rect[3])-self.styles["table.header"].height
+        return max(body//self.styles["table.row"].height, 0)
+
+    def scrollTo(self, first_row:int):
+        """Scrolls so that first_row (in display order) is the first visible row
+        """
+        self.first_row = int(min(max(first_row, 0), max(self.row_count-self.visible_rows, 0)))
+
+    def format(self, name:str, values:np.ndarray)->list:
+        fmt = self.formats.get(name, str)
+        if isinstance(fmt, str):
+            return [fmt.format(v) for v in values.tolist()]
+        return [fmt(v) for v in values.tolist()]
+
+    def model_rows(self, first:int, last:int)->np.ndarray:
+        """Returns the model indices of the display rows [first, last)
+        """
+        if self.order is None:
+            return np.arange(first, last)
+        return self.order[first:last]
+
+    def render_rows(self, first:int, last:int, widths:list):
+        """Returns the surfaces of the display rows [first, last), formatting and rendering only the ones not in cache
+        """
+        indices = self.model_rows(first, last)
+        surfaces = [None]*len(indices)
+        missing = []
+        for i, index in enumerate(indices.tolist()):
+            key = (index, index == self.selected_row, (first+i)%2)
+            surface = self.rows.get(key)
+            if surface is None:
+                missing.append(i)
+            else:
+                surfaces[i] = surface
+        if len(missing)>0:
+            # Fetch and format the missing cells column by column
+            rows = indices[missing]
+            if self.order is None and len(rows)>0 and rows[-1]-rows[0] == len(rows)-1:
+                rows = slice(int(rows[0]), int(rows[-1])+1)
+            texts = [self.format(name, np.asarray(self.provider(name, rows))) for name in self.names]
+            for j, i in enumerate(missing):
+                index = int(indices[i])
+                if index == self.selected_row:
+                    style = self.styles["table.row.selected"]
+                elif (first+i)%2:
+                    style = self.styles["table.row.alternate"]
+                else:
+                    style = self.styles["table.row"]
+                surface = pygame.Surface((sum(widths), style.height))
+                surface.fill(style.bg_color)
+                x = 0
+                for column, width in enumerate(widths):
+                    self.blit_cell(surface, texts[column][j], style, [x, 0, width, style.height])
+                    x += width
+                surfaces[i] = self.rows.put((index, index == self.selected_row, (first+i)%2), to_display_format(surface))
+        return surfaces
+
+    def blit_cell(self, surface, text:str, style:WidgetStyle, rect:list):
+        # Cells texts are rendered directly, caching them would only flush the shared text cache
+        with font_lock:
+            text_render = style.font.render(text, True, style.text_color)
+        width = min(text_render.get_width(), rect[2]-style.left_margin-style.right_margin)
+        if style.align == 'right':
+            x = rect[0]+rect[2]-style.right_margin-width
+        elif style.align == 'center':
+            x = rect[0]+(rect[2]-width)//2
+        else:
+            x = rect[0]+style.left_margin
+        surface.blit(text_render, (x, rect[1]+(rect[3]-text_render.get_height())//2), (0, 0, max(width, 0), rect[3]))
+
+    def paint(self, screen):
+        style = self.styles["table"]
+        header_style = self.styles["table.header"]
+        row_height = self.styles["table.row"].height
+        widths = self.widths()
+        size = (int(self.rect[2]), int(self.rect[3])-header_style.height)
+        if size[0]<=0 or size[1]<=0:
+            return
+        self.scrollTo(self.first_row)
+        visible = min(self.visible_rows+1, self.row_count-self.first_row)
+        state = (size, tuple(widths), self.selected_row)
+        if self.canvas is None or self.canvas.get_size() != size or self.canvas_state is None or self.canvas_state[0] != state:
+            self.rows.clear()
+            self.canvas = pygame.Surface(size, 0, screen)
+            self.canvas.fill(style.bg_color)
+            first, last = self.first_row, self.first_row+visible
+        else:
+            # Move the rows already on the canvas and only render the exposed ones
+            delta = self.first_row-self.canvas_state[1]
+            if abs(delta)>=visible:
+                self.canvas.fill(style.bg_color)
+                first, last = self.first_row, self.first_row+visible
+            elif delta>0:
+                self.canvas.scroll(0, -delta*row_height)
+                self.canvas.fill(style.bg_color, (0, (visible-delta)*row_height, size[0], size[1]))
+                first, last = self.first_row+visible-delta-1, self.first_row+visible
+            elif delta<0:
+                self.canvas.scroll(0, -delta*row_height)
+                first, last = self.first_row, self.first_row-delta
+            else:
+                first, last = 0, 0
+        if last>first:
+            surfaces = self.render_rows(first, last, widths)
+            self.canvas.blits([(surface, (0, (first-self.first_row+i)*row_height)) for i, surface in enumerate(surfaces)], False)
+        self.canvas_state = (state, self.first_row)
+        screen.blit(self.canvas, (self.rect[0], self.rect[1]+header_style.height))
+
+        # Header
+        x = self.rect[0]
+        header_rect = [self.rect[0], self.rect[1], self.rect[2], header_style.height]
+        self.draw_rect(screen, header_style, header_rect)
+        for name, width in zip(self.names, widths):
+            if name == self.sort_column:
+                name += " v" if self.sort_descending else " ^"
+            self.blit_text(name, header_style, screen, [x, self.rect[1], width, header_style.height])
+            x += width
+
+    def handle_events(self, events):
+        """Handles the events
+
+        """
+        header_height = self.styles["table.header"].height
+        row_height = self.styles["table.row"].height
+        for event in events:
+            if event.type == pygame.MOUSEWHEEL:
+                if is_point_inside_rect(self.mouse_position(),self.rect_left_top_right_bottom):
+                    self.scrollTo(self.first_row-3*event.y)
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                if not is_point_inside_rect(event.pos,self.rect_left_top_right_bottom):
+                    continue
+                if event.pos[1]<self.rect[1]+header_height:
+                    # Sort by the clicked column, clicking again reverses the order
+                    x = self.rect[0]
+                    for name, width in zip(self.names, self.widths()):
+                        if x<=event.pos[0]<x+width:
+                            self.sortBy(name, not self.sort_descending if name == self.sort_column else False)
+                            break
+                        x += width
+                else:
+                    row = self.first_row+(event.pos[1]-self.rect[1]-header_height)//row_height
+                    if row<self.row_count:
+                        self.selected_row = int(self.model_rows(row, row+1)[0])
+                        if self.selection_changed_callback is not None:
+                            self.selection_changed_callback(self.selected_row)
+
+# =============================================== Plot ==========================================
+
+class RingBuffer():
+    def __init__(self, capacity:int, dtype=np.float64):
+        """A preallocated ring buffer of samples with O(1) append and vectorized batch append
+
+        Args:
+            capacity (int): The maximum number of samples kept
+            dtype (optional): The type of the samples. Defaults to np.float64.
+        """
+        self.data = np.zeros(capacity, dtype)
+        self.capacity = capacity
+        self.head = 0       # Index where the next sample is written
+        self.total = 0      # Number of samples ever appended
+
+    def append(self, value):
+        self.data[self.head] = value
+        self.head = (self.head+1)%self.capacity
+        self.total += 1
+
+    def extend(self, values):
+        values = np.asarray(values, self.data.dtype).ravel()
+        n = len(values)
+        if n>=self.capacity:
+            self.data[:] = values[n-self.capacity:]
+            self.head = 0
+        else:
+            first = min(n, self.capacity-self.head)
+            self.data[self.head:self.head+first] = values[:first]
+            self.data[:n-first] = values[first:]
+            self.head = (self.head+n)%self.capacity
+        self.total += n
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def range(self, start:int, stop:int)->np.ndarray:
+        """Returns the samples with absolute indices in [start, stop), clamped to the kept ones
+        """
+        start = max(start, self.total-len(self))
+        stop = min(stop, self.total)
+        if stop<=start:
+            return self.data[:0]
+        i = (self.head-(self.total-start))%self.capacity
+        j = i+stop-start
+        if j<=self.capacity:
+            return self.data[i:j]
+        return np.concatenate([self.data[i:], self.data[:j-self.capacity]])
+
+class Plot(Widget):
+    def __init__(
+                    self,
+                    parent=None,
+                    rect:tuple=[0,0,400,200],
+                    style:str="",
+                    series:list=["series"],
+                    capacity:int=1000000,
+                    samples_per_pixel:int=1,
+                    y_range:tuple=None
+                ):
+        """Builds a streaming time series plot.
+        Samples are stored in preallocated ring buffers, each pixel column shows the min/max of the
+        samples_per_pixel samples it covers, so a million samples never draw more than width segments.
+        When new samples arrive the already drawn curve is scrolled and only the new columns are drawn.
+
+        The background is styled with the plot selector and each series with plot.series.<name>
+        (color sets the curve color, border-size its width).
+
+        Args:
+            series (list, optional): The names of the series. Defaults to ["series"].
+            capacity (int, optional): The number of samples kept per series. Defaults to 1000000.
+            samples_per_pixel (int, optional): The number of samples in one pixel column. Defaults to 1.
+            y_range (tuple, optional): The (min, max) shown values, None to fit the data. Defaults to None.
+        """
+        palette = get_palette(overlay_class_colors)
+        Widget.__init__(self, parent, rect, style, extra_styles=self.merge_two_dicts(
+            {"plot":WidgetStyle(bg_color=get_color("white"))},
+            {f"plot.series.{name}":WidgetStyle(text_color=palette[i%len(palette)], border_size=1) for i, name in enumerate(series)}
+        ))
+        self.series = {name:RingBuffer(capacity) for name in series}
+        self.samples_per_pixel = samples_per_pixel
+        self.y_range = y_range
+        self.canvas = None
+        self.drawn_columns = 0
+        self.drawn_range = None
+
+    def dispose(self):
+        self.canvas = None
+        self.drawn_columns = 0
+        self.drawn_range = None
+
+    def append(self, name:str, value:float):
+        """Appends one sample to a series
+        """
+        self.series[name].append(value)
+
+    def extend(self, name:str, values):
+        """Appends a batch of samples to a series
+        """
+        self.series[name].extend(values)
+
+    def setYRange(self, y_range:tuple):
+        """Sets the (min, max) shown values, None to fit the data
+        """
+        self.y_range = y_range
+        self.canvas = None
+
+    def columns(self, buffer:RingBuffer, first:int, last:int):
+        """Returns the min and max of the columns [first, last), and of the column before first to join the curve
+        """
+        spp = self.samples_per_pixel
+        start = max(first-1, 0)
+        samples = buffer.range(start*spp, last*spp)
+        n = len(samples)//spp
+        start = last-n
+        samples = samples[len(samples)-n*spp:].reshape(n, spp)
+        return start, samples.min(axis=1), samples.max(axis=1)
+
+    def draw_columns(self, first:int, last:int, x_last:int, y_range:tuple):
+        """Draws the columns [first, last) of all series on the canvas, column last-1 being at x_last
+        """
+        h = self.canvas.get_height()
+        low, high = y_range
+        ratio = (h-1)/(high-low) if high>low else 0
+        for name, buffer in self.series.items():
+            style = self.styles[f"plot.series.{name}"]
+            start, mins, maxs = self.columns(buffer, first, last)
+            if len(mins) == 0:
+                continue
+            # Join each column to the previous one
+            lows = np.minimum(mins[1:], maxs[:-1])
+            highs = np.maximum(maxs[1:], mins[:-1])
+            if start == first:
+                lows = np.concatenate([mins[:1], lows])
+                highs = np.concatenate([maxs[:1], highs])
+                start -= 1
+            y0 = np.clip(np.round(h-1-(highs-low)*ratio), 0, h-1).astype(np.int64).tolist()
+            y1 = np.clip(np.round(h-1-(lows-low)*ratio), 0, h-1).astype(np.int64).tolist()
+            x = x_last-(last-1-(start+1))
+            width = max(style.border_size, 1)
+            for top, bottom in zip(y0, y1):
+                pygame.draw.line(self.canvas, style.text_color, (x, top), (x, bottom), width)
+                x += 1
+
+    def data_range(self, columns:int):
+        """Returns the min and max of the samples visible in the last columns
+        """
+        total = max(buffer.total for buffer in self.series.values())//self.samples_per_pixel
+        lows, highs = [], []
+        for buffer in self.series.values():
+            samples = buffer.range((total-columns)*self.samples_per_pixel, total*self.samples_per_pixel)
+            if len(samples)>0:
+                lows.append(samples.min())
+                highs.append(samples.max())
+        if len(lows) == 0:
+            return (0.0, 1.0)
+        return (float(min(lows)), float(max(highs)))
+
+    def paint(self, screen):
+        style = self.styles["plot"]
+        size = (int(self.rect[2]), int(self.rect[3]))
+        if size[0]<=0 or size[1]<=0:
+            return
+        total = max(buffer.total for buffer in self.series.values())//self.samples_per_pixel
+        new_columns = total-self.drawn_columns
+        y_range = self.y_range
+        if y_range is None:
+            y_range = self.drawn_range
+            low, high = self.data_range(min(new_columns, size[0]) if self.canvas is not None else size[0])
+            if y_range is None or low<y_range[0] or high>y_range[1]:
+                low, high = self.data_range(size[0])
+                margin = (high-low)*0.1 or 1.0
+                y_range = (low-margin, high+margin)
+
+        if self.canvas is None or self.canvas.get_size() != size or y_range != self.drawn_range or new_columns>=size[0]:
+            # Full redraw
+            self.canvas = pygame.Surface(size, 0, screen)
+            self.canvas.fill(style.bg_color if style.bg_color is not None else (0, 0, 0))
+            self.draw_columns(max(total-size[0], 0), total, size[0]-1, y_range)
+        elif new_columns>0:
+            # Scroll the drawn curve and only draw the new columns
+            self.canvas.scroll(-new_columns, 0)
+            self.canvas.fill(style.bg_color if style.bg_color is not None else (0, 0, 0), (size[0]-new_columns, 0, new_columns, size[1]))
+            self.draw_columns(self.drawn_columns, total, size[0]-1, y_range)
+        self.drawn_columns = total
+        self.drawn_range = y_range
+        screen.blit(self.canvas, (self.rect[0], self.rect[1]))
+        if style.border_size>0:
+            pygame.draw.rect(screen, style.border_color, self.rect, style.border_size)
+
+# =============================================== Process widget ==========================================
+
+# Shared header : generation, published slot, slot read by the main process, then (width, height) per slot
+_process_header_items = 3
+_process_slots = 3
+# Events forwarded to the worker process
+_mouse_events = (pygame.MOUSEMOTION, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP)
+_keyboard_events = (pygame.KEYDOWN, pygame.KEYUP, pygame.TEXTINPUT)
+
+def _process_buffers(shm, max_size:tuple):
+    header_size = 8*(_process_header_items+2*_process_slots)
+    slot_size = max_size[0]*max_size[1]*4
+    header = np.ndarray((header_size//8,), np.int64, shm.buf, 0)
+    slots = [shm.buf[header_size+i*slot_size:header_size+(i+1)*slot_size] for i in range(_process_slots)]
+    return header, slots
+
+def _render_worker(builder, shm_name:str, max_size:tuple, commands, fps:float):
+    """Worker process of a ProcessWidget : builds the subtree, then paints it into the free slots of the shared buffer
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    header, slots = _process_buffers(shm, max_size)
+    built = builder()
+    root, update = built if isinstance(built, tuple) else (built, None)
+    size = None
+    period = 1/fps
+    running = True
+    next_frame = time.monotonic()
+    while running:
+        try:
+            command = commands.get(timeout=max(next_frame-time.monotonic(), 0))
+        except queue.Empty:
+            command = None
+        events = []
+        while command is not None:
+            if command[0] == "stop":
+                running = False
+            elif command[0] == "resize":
+                size = command[1]
+                root.setRect([0, 0, size[0], size[1]])
+            elif command[0] == "events":
+                events += [pygame.event.Event(event_type, attributes) for event_type, attributes in command[1]]
+            try:
+                command = commands.get_nowait()
+            except queue.Empty:
+                command = None
+        if events:
+            root.handle_events(events)
+        if not running or size is None or time.monotonic()<next_frame:
+            continue
+        next_frame = max(next_frame+period, time.monotonic())
+        if update is not None:
+            update()
+        flush_deliveries()
+        flush_changes()
+        # Paint into a slot that is neither published nor being read by the main process
+        slot = next(i for i in range(_process_slots) if i != header[1] and i != header[2])
+        surface = pygame.image.frombuffer(slots[slot][:size[0]*size[1]*4], size, "BGRA")
+        surface.set_alpha(None)
+        root.paint(surface)
+        del surface
+        header[_process_header_items+2*slot] = size[0]
+        header[_process_header_items+2*slot+1] = size[1]
+        header[1] = slot
+        header[0] += 1
+    del header
+    slots.clear()
+    shm.close()
+
+class _ProcessFrames():
+    def __init__(self, max_size:tuple):
+        """The shared memory of a ProcessWidget and every view on it, kept together so that the views
+        can be dropped before the memory is closed (a closed buffer must have no exported views left)
+
+        Args:
+            max_size (tuple): The largest size of the frames
+        """
+        header_size = 8*(_process_header_items+2*_process_slots)
+        self.shm = shared_memory.SharedMemory(create=True, size=header_size+_process_slots*max_size[0]*max_size[1]*4)
+        self.header, self.slots = _process_buffers(self.shm, max_size)
+        self.header[:] = 0
+        self.header[1] = self.header[2] = -1
+        # Surface viewing the last frame read
+        self.view = None
+
+    def close(self):
+        self.view = None
+        self.header = None
+        self.slots.clear()
+        self.shm.close()
+        self.shm.unlink()
+
+def _stop_render_worker(process, commands, frames:_ProcessFrames):
+    """Stops the worker process of a ProcessWidget and frees the shared memory.
+    Called once, by ProcessWidget.close or when the widget is garbage collected, so it must not reference the widget
+    """
+    if process.is_alive():
+        commands.put(("stop",))
+        process.join(1)
+        if process.is_alive():
+            process.terminate()
+    frames.close()
+
+class ProcessWidget(Widget):
+    # Its worker process is stopped when released
+    reusable = False
+
+    def __init__(
+                    self,
+                    builder,
+                    parent=None,
+                    rect:tuple=None,
+                    style:str="widget{background-color:#a9a9a9;}\n",
+                    max_size:tuple=(1920,1080),
+                    fps:float=30
+                ):
+        """A widget whose subtree is built and painted by a worker process, so that heavy panes render on another core.
+        The worker paints into a triple buffer in shared memory, the main process blits the last published buffer
+        through a surface viewing the shared memory (no copy). Mouse events inside the widget and keyboard events
+        after a click inside it are forwarded to the worker, with positions relative to the widget.
+
+        Args:
+            builder (callable): A picklable function (defined at module level) called in the worker, returning the root widget of the subtree or a (root widget, update function) pair, the update function being called before each paint
+            max_size (tuple, optional): The largest size of the widget. Defaults to (1920,1080).
+            fps (float, optional): The rendering rate of the worker. Defaults to 30.
+        """
+        self.max_size = tuple(max_size)
+        self.size = None
+        self.generation = 0
+        self.focused = False
+        self.hovered = False
+        self.frames = _ProcessFrames(self.max_size)
+        # Spawn : the worker must not inherit the display of this process
+        context = multiprocessing.get_context("spawn")
+        self.commands = context.Queue()
+        self.process = context.Process(target=_render_worker, args=(builder, self.frames.shm.name, self.max_size, self.commands, fps), daemon=True)
+        self.process.start()
+        # Widgets removed without being released still stop their worker once collected
+        self.closer = weakref.finalize(self, _stop_render_worker, self.process, self.commands, self.frames)
+        Widget.__init__(self, parent, rect, style)
+
+    def dispose(self):
+        self.close()
+
+    def setRect(self, rect):
+        Widget.setRect(self, rect)
+        size = (min(int(rect[2]), self.max_size[0]), min(int(rect[3]), self.max_size[1]))
+        if size != self.size and size[0]>0 and size[1]>0:
+            self.size = size
+            self.commands.put(("resize", size))
+
+    def acquire(self):
+        """Marks the last published slot as read by the main process and returns it
+        """
+        while True:
+            slot = int(self.frames.header[1])
+            self.frames.header[2] = slot
+            # The worker may have published another slot meanwhile, it could then be painting this one
+            if int(self.frames.header[1]) == slot:
+                return slot
+
+    def paint(self, screen):
+        """Blits the last frame published by the worker
+        """
+        frames = self.frames
+        if not self.closer.alive:
+            return
+        generation = int(frames.header[0])
+        if generation != self.generation:
+            self.generation = generation
+            slot = self.acquire()
+            w = int(frames.header[_process_header_items+2*slot])
+            h = int(frames.header[_process_header_items+2*slot+1])
+            frames.view = pygame.image.frombuffer(frames.slots[slot][:w*h*4], (w, h), "BGRA")
+            frames.view.set_alpha(None)
+        if frames.view is None:
+            style = self.styles["widget"]
+            if style.bg_color is not None:
+                self.draw_rect(screen, style)
+        else:
+            screen.blit(frames.view, (self.rect[0], self.rect[1]))
+
+    def handle_events(self, events):
+        """Forwards the events concerning the widget to the worker
+        """
+        forwarded = []
+        for event in events:
+            if event.type in _mouse_events:
+                inside = is_point_inside_rect(event.pos, self.rect_left_top_right_bottom)
+                if event.type == pygame.MOUSEBUTTONDOWN:
+                    self.focused = inside
+                # Motions leaving the widget are forwarded too so that hovering ends
+                if inside or self.hovered or event.type == pygame.MOUSEBUTTONUP:
+                    attributes = dict(event.dict)
+                    attributes["pos"] = (event.pos[0]-self.rect[0], event.pos[1]-self.rect[1])
+                    forwarded.append((event.type, attributes))
+                if event.type == pygame.MOUSEMOTION:
+                    self.hovered = inside
+            elif event.type == pygame.MOUSEWHEEL and self.hovered or event.type in _keyboard_events and self.focused:
+                forwarded.append((event.type, dict(event.dict)))
+        if forwarded:
+            self.commands.put(("events", forwarded))
+
+    def close(self):
+        """Stops the worker process and frees the shared memory, only the first call does something
+        """
+        self.closer()
+
 # =============================================== Menus ==========================================
 # ---------------------------------------------------- Menu Bar -----------------------------------------------------
 
@@ -1178,6 +4500,26 @@ class MenuBar(Widget):
     def addMenu(self, menu):
         self.menus.append(menu)
 
+    def removeMenu(self, menu)->Widget:
+        """Removes a menu and its actions
+
+        Returns:
+            Menu: The removed menu
+        """
+        menu.close()
+        self.menus.remove(menu)
+        window = self.window()
+        if window is not None:
+            window.forget(menu)
+        menu.parent = None
+        return menu
+
+    def removeChild(self, widget:Widget):
+        self.removeMenu(widget)
+
+    def children(self)->list:
+        return list(self.menus)
+
     @property
     def width(self):
         w, h = pygame.display.get_surface().get_size()
@@ -1232,28 +4574,91 @@ class Menu(Button):
                 caption="",
                 style:str="",
     ):
-        Button.__init__(self, caption,style=style,extra_styles={
-            "btn.normal":WidgetStyle(border_radius=0,text_color=(255,255,255), bg_color=get_color("#878787")),
-            "btn.hover":WidgetStyle(border_radius=0,text_color=(255,255,255), bg_color=get_color("#a9a9a9")),
-            "btn.pressed":WidgetStyle(border_radius=0,text_color=(255,255,255), bg_color=get_color("#565656")),
-        })
+        Button.__init__(self, caption,style=style,extra_styles=menu_button_styles)
         self.parent = parent
         self.actions=[]
+        self.opened = False
+        # The drop down, shown in a window layer while the menu is open
+        self.popup = MenuPopup(self)
         parent.addMenu(self)
         self.clicked_event_handler      = self.fn_clicked_event_handler
         self.lost_focus_event_handler   = self.fn_lost_focus_event_handler
 
+    def reset(self):
+        Widget.reset(self)
+        self.close()
+        self.hovered=False
+        self.pressed=False
+        self.toggled=False
+
     def fn_clicked_event_handler(self):
-        for action in self.actions:
-            action.visible=not action.visible
+        if self.opened:
+            self.close()
+        else:
+            self.open()
 
     def fn_lost_focus_event_handler(self):
+        self.close()
+
+    def open(self):
+        """Shows the actions in a layer above the window, their geometry is computed once here
+        """
+        for action in self.actions:
+            action.visible=True
+        self.layout_actions()
+        window = self.window()
+        if window is not None and not self.opened:
+            window.pushOverlay(self.popup)
+        self.opened = True
+
+    def close(self):
         for action in self.actions:
             action.visible=False
+        window = self.window()
+        if window is not None:
+            window.removeOverlay(self.popup)
+        self.opened = False
+
+    def layout_actions(self):
+        """Places the actions under the menu and the popup around them
+        """
+        if self.rect is None:
+            return
+        y=self.rect[1]+self.rect[3]
+        for action in self.actions:
+            _, y = action.prepare(self.rect[0], y)
+        if len(self.actions)>0:
+            area = pygame.Rect(self.actions[0].rect).unionall([pygame.Rect(action.rect) for action in self.actions])
+            self.popup.setRect([area.x, area.y, area.w, area.h])
+        else:
+            self.popup.setRect([self.rect[0], y, 0, 0])
 
     def addAction(self, action):
-        action.visible=False
+        action.visible=self.opened
         self.actions.append(action)
+        if self.opened:
+            self.layout_actions()
+
+    def removeAction(self, action)->Widget:
+        """Removes an action
+
+        Returns:
+            Action: The removed action
+        """
+        self.actions.remove(action)
+        window = self.window()
+        if window is not None:
+            window.forget(action)
+        action.parent = None
+        if self.opened:
+            self.layout_actions()
+        return action
+
+    def removeChild(self, widget:Widget):
+        self.removeAction(widget)
+
+    def children(self)->list:
+        return list(self.actions)
 
     def prepare(self, rect_xstart=0, rect_ystart=0):
         style = self.styles["widget"]
@@ -1266,26 +4671,36 @@ class Menu(Button):
         else:
             w = 100
 
-        self.setRect([rect_xstart,rect_ystart,w, h])
+        rect = [rect_xstart,rect_ystart,w, h]
+        if rect != self.rect:
+            self.setRect(rect)
+            if self.opened:
+                self.layout_actions()
 
         return rect_xstart + w, rect_ystart
 
     def paint(self, screen):
-        style = self.styles["widget"]
+        # The actions are painted by the popup layer
         Button.paint(self, screen)
-        y=self.rect[1]+self.rect[3]
-        for action in self.actions:
-            _, y = action.prepare(self.rect[0], y)
-            if action.visible:
-                action.paint(screen)
 
+class MenuPopup(Widget):
+    def __init__(self, menu:Menu):
+        """The drop down of a menu, shown in a window layer (see Overlay) with the visible actions of the menu
+        """
+        Widget.__init__(self, menu, style="")
+
+    def children(self)->list:
+        return list(self.parent.actions)
 
+    def paint(self, screen):
+        for action in self.parent.actions:
+            if action.visible:
+                action.paint(screen)
 
     def handle_events(self, events):
-        for action in self.actions:
+        for action in self.parent.actions:
             if action.visible:
                 action.handle_events(events)
-        return super().handle_events(events)     
 
 
 # ---------------------------------------------------- Action -----------------------------------------------------
@@ -1298,11 +4713,7 @@ class Action(Button):
                 caption="",
                 style:str="",
     ):
-        Button.__init__(self, caption,style=style,extra_styles={
-            "btn.normal":WidgetStyle(border_radius=0,text_color=(255,255,255), bg_color=get_color("#878787")),
-            "btn.hover":WidgetStyle(border_radius=0,text_color=(255,255,255), bg_color=get_color("#a9a9a9")),
-            "btn.pressed":WidgetStyle(border_radius=0,text_color=(255,255,255), bg_color=get_color("#565656")),            
-        })
+        Button.__init__(self, caption,style=style,extra_styles=menu_button_styles)
         self.parent = parent
         self.actions=[]
         parent.addAction(self)
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""=== Face Analyzer Helpers =>
+    Module : loader
+    Author : Saifeddine ALOUI (ParisNeo)
+    Licence : MIT
+    Description :
+        Declarative UI descriptions compiled to cached construction plans
+<================"""
+import os
+import json
+import hashlib
+
+import OOPyGame
+from OOPyGame import Widget, live_widgets, parsed_stylesheets, parse_stylesheet
+
+# Bump when the plan format changes so that stale plans are recompiled
+PLAN_VERSION = 2
+# Classes built with their parent as first constructor argument instead of being added to it
+constructor_parented = ("Menu", "Action", "MenuSeparator")
+
+# A UI description is a JSON document :
+# {
+#     "menu_bar": {"style": "...", "menus": [
+#         {"caption": "File", "id": "file", "actions": [
+#             {"caption": "New"}, {"separator": true}, {"caption": "Quit", "on": {"clicked_event_handler": "fn_quit"}}
+#         ]}
+#     ]},
+#     "widgets": [
+#         {"class": "HorizontalLayout", "id": "layout_1", "children": [
+#             {"class": "List", "percent": "20%", "args": {"list": ["a", "b"]}},
+#             {"class": "Button", "percent": 0.8, "args": {"text": "Hello"}, "style": "btn.normal{color:red;}"}
+#         ]}
+#     ]
+# }
+# Widget entries accept :
+#     class : The widget class name
+#     id : The name under which the widget is returned and set on the handlers object, also the widget id for the theme selectors
+#     args : The constructor keyword arguments
+#     properties : Attributes set after construction (value of a slider...)
+#     style : A stylesheet applied on top of the default style of the class
+#     on : Callback attributes mapped to handler method names
+#     percent : The share of a HorizontalLayout or VerticalLayout ("20%" or 0.2)
+#     title : The title in a FormLayout
+#     children : The widgets added to this layout
+
+def _percent(value):
+    if isinstance(value, str):
+        value = value.strip()
+        return float(value[:-1])/100 if value.endswith("%") else float(value)
+    return value
+
+def compile_ui(description:dict, widget_classes:dict=None)->dict:
+    """Compiles a UI description into a flat construction plan.
+    The plan is a list of operations referring to the built objects by index, its stylesheets are parsed
+    during compilation and stored with it.
+
+    Args:
+        description (dict): The UI description (see the module documentation)
+        widget_classes (dict, optional): Extra widget classes by name. Defaults to None.
+
+    Returns:
+        dict: The plan
+    """
+    ops = []
+    ids = {}
+    count = [0]
+
+    def resolve(class_name):
+        if widget_classes is not None and class_name in widget_classes:
+            return class_name
+        cls = getattr(OOPyGame, class_name, None)
+        if not (isinstance(cls, type) and issubclass(cls, Widget)):
+            raise ValueError(f"Unknown widget class {class_name}")
+        return class_name
+
+    def new(class_name, parent, entry):
+        index = count[0]
+        count[0] += 1
+        style = entry.get("style", "")
+        if style:
+            parse_stylesheet(style)
+        ops.append(("new", class_name, parent, entry.get("args", {}), entry.get("properties", {}), style, entry.get("on", {})))
+        if "id" in entry:
+            if entry["id"] in ids:
+                raise ValueError(f"Duplicate id {entry['id']}")
+            ids[entry["id"]] = index
+        return index
+
+    def add_widget(entry, parent):
+        class_name = resolve(entry["class"])
+        index = new(class_name, None, entry)
+        for child in entry.get("children", []):
+            add_widget(child, index)
+        if "title" in entry:
+            placement = entry["title"]
+        else:
+            placement = _percent(entry.get("percent"))
+        ops.append(("add", parent, index, placement))
+
+    menu_bar = description.get("menu_bar")
+    if menu_bar is not None:
+        bar = new("MenuBar", None, menu_bar)
+        for menu in menu_bar.get("menus", []):
+            menu_index = new("Menu", bar, dict(menu, args=dict(menu.get("args", {}), caption=menu["caption"])))
+            for action in menu.get("actions", []):
+                if action.get("separator", False):
+                    new("MenuSeparator", menu_index, action)
+                else:
+                    new("Action", menu_index, dict(action, args=dict(action.get("args", {}), caption=action["caption"])))
+    for entry in description.get("widgets", []):
+        add_widget(entry, None)
+
+    return {"version":PLAN_VERSION, "ops":ops, "ids":ids, "stylesheets":{}}
+
+def _stylesheet_rules(rules)->tuple:
+    """Converts stylesheet rules read from JSON back to the tuples returned by parse_stylesheet
+    """
+    return tuple((selector, tuple((name, value) for name, value in properties)) for selector, properties in rules)
+
+def build_ui(plan:dict, window=None, handlers=None, widget_classes:dict=None)->dict:
+    """Builds the widgets of a compiled plan
+
+    Args:
+        plan (dict): The plan returned by compile_ui
+        window (WindowManager, optional): The window receiving the menu bar and the top level widgets. Defaults to None.
+        handlers (object, optional): The object holding the callbacks named in the description, widgets with an id are set on it. Defaults to window.
+        widget_classes (dict, optional): Extra widget classes by name. Defaults to None.
+
+    Returns:
+        dict: The widgets by id
+    """
+    # Seed the stylesheet cache so that no stylesheet is parsed again
+    for style, rules in plan["stylesheets"].items():
+        parsed_stylesheets.setdefault(style, _stylesheet_rules(rules))
+    if handlers is None:
+        handlers = window
+    objects = []
+    idents = {index:name for name, index in plan["ids"].items()}
+    for op in plan["ops"]:
+        if op[0] == "new":
+            index = len(objects)
+            _, class_name, parent, args, properties, style, on = op
+            if class_name == "MenuBar" and window is not None:
+                obj = window.build_menu_bar()
+            else:
+                cls = widget_classes[class_name] if widget_classes is not None and class_name in widget_classes else getattr(OOPyGame, class_name)
+                if class_name in constructor_parented:
+                    obj = cls(objects[parent], **args)
+                else:
+                    obj = cls(**args)
+            if index in idents:
+                obj.setId(idents[index])
+            if style:
+                obj.applyStyleRules(parse_stylesheet(style))
+            for name, value in properties.items():
+                setattr(obj, name, value)
+            for name, handler in on.items():
+                setattr(obj, name, getattr(handlers, handler))
+            objects.append(obj)
+        else:
+            _, parent, child, placement = op
+            if parent is None:
+                if window is not None:
+                    window.addWidget(objects[child])
+            elif placement is None:
+                objects[parent].addWidget(objects[child])
+            else:
+                objects[parent].addWidget(objects[child], placement)
+    widgets = {name:objects[index] for name, index in plan["ids"].items()}
+    if handlers is not None:
+        for name, widget in widgets.items():
+            setattr(handlers, name, widget)
+    return widgets
+
+def load_ui(path:str, window=None, handlers=None, widget_classes:dict=None, cache:bool=True)->dict:
+    """Loads a JSON UI description.
+    The compiled plan is stored as JSON next to the description (same name with a .uiplan extension) and
+    reused as long as the hash of the description does not change, so a warm start neither compiles
+    the description nor parses any stylesheet it uses.
+
+    Args:
+        path (str): The path to the JSON description
+        window (WindowManager, optional): The window receiving the menu bar and the top level widgets. Defaults to None.
+        handlers (object, optional): The object holding the callbacks named in the description. Defaults to window.
+        widget_classes (dict, optional): Extra widget classes by name. Defaults to None.
+        cache (bool, optional): If False the plan is neither read nor written. Defaults to True.
+
+    Returns:
+        dict: The widgets by id
+    """
+    with open(path, "rb") as f:
+        source = f.read()
+    digest = hashlib.sha256(source).hexdigest()
+    plan_path = os.path.splitext(path)[0]+".uiplan"
+
+    plan = None
+    if cache and os.path.exists(plan_path):
+        try:
+            with open(plan_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if isinstance(cached, dict) and cached.get("version") == PLAN_VERSION and cached.get("hash") == digest:
+                plan = cached
+        except (OSError, ValueError):
+            plan = None
+
+    if plan is not None:
+        return build_ui(plan, window, handlers, widget_classes)
+
+    plan = compile_ui(json.loads(source.decode("utf-8")), widget_classes)
+    plan["hash"] = digest
+    existing = set(live_widgets)
+    widgets = build_ui(plan, window, handlers, widget_classes)
+    if cache:
+        # Store the stylesheets this UI needs : the ones of the description and the default ones of the built widgets
+        styles = {op[5] for op in plan["ops"] if op[0] == "new" and op[5]}
+        styles.update(widget.style for widget in live_widgets if widget not in existing and isinstance(widget.style, str))
+        plan["stylesheets"] = {style:parse_stylesheet(style) for style in styles}
+        try:
+            with open(plan_path, "w", encoding="utf-8") as f:
+                json.dump(plan, f)
+        except OSError:
+            # Read only location, the plan is simply compiled at each start
+            pass
+    return widgets
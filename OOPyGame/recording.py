@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""=== Face Analyzer Helpers =>
+    Module : recording
+    Author : Saifeddine ALOUI (ParisNeo)
+    Licence : MIT
+    Description :
+        Screen recording with background encoding
+<================"""
+import os
+import time
+import queue
+import struct
+import threading
+
+import numpy as np
+import pygame
+
+from OOPyGame.streaming import screen_pixels
+
+# Raw and rle files : magic, format, red/green/blue/alpha masks
+FILE_HEADER = struct.Struct("<4s4sIIII")
+FILE_MAGIC = b"OOPR"
+# Raw frame : timestamp, width, height, then the pixels
+RAW_HEADER = struct.Struct("<dHH")
+# Rle frame : timestamp, width, height, runs count, then the runs starts and lengths (uint32) and the pixels of the runs
+RLE_HEADER = struct.Struct("<dHHI")
+
+formats = ("raw", "png", "rle")
+
+class ScreenRecorder():
+    def __init__(self, path:str, format:str="rle", slots:int=8, fps:float=None):
+        """Records the frames of a window.
+        The window copies each frame into a free buffer of a preallocated ring, a background thread encodes and
+        writes the buffers then gives them back. When all buffers are waiting for the disk, frames are dropped
+        instead of stalling the window.
+
+        Formats :
+            raw : all the pixels of each frame in a single file
+            png : a directory of png files, one per frame
+            rle : the runs of pixels changed since the previous frame in a single file
+
+        Args:
+            path (str): The file (raw, rle) or the directory (png)
+            format (str, optional): 'raw', 'png' or 'rle'. Defaults to "rle".
+            slots (int, optional): The number of frame buffers. Defaults to 8.
+            fps (float, optional): The maximum recording rate. Defaults to None (every frame).
+        """
+        if format not in formats:
+            raise ValueError(f"Unknown recording format {format}, use one of {formats}")
+        self.path = path
+        self.format = format
+        self.slots = slots
+        self.period = 1/fps if fps else 0
+        self.buffers = [None]*slots
+        self.timestamps = [0.0]*slots
+        self.free = queue.Queue()
+        self.pending = queue.Queue()
+        for i in range(slots):
+            self.free.put(i)
+        self.masks = None
+        self.last_time = None
+        self.frames_recorded = 0
+        self.frames_dropped = 0
+        self.thread = None
+
+    def start(self):
+        """Opens the output and starts the encoder thread
+        """
+        if self.format == "png":
+            os.makedirs(self.path, exist_ok=True)
+            self.file = None
+        else:
+            self.file = open(self.path, "wb")
+        self.thread = threading.Thread(target=self._encode, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Writes the frames still waiting and closes the output
+        """
+        if self.thread is None:
+            return
+        self.pending.put(None)
+        self.thread.join()
+        self.thread = None
+        if self.file is not None:
+            self.file.close()
+
+    def publish(self, screen:pygame.Surface):
+        """Copies the screen into a free buffer, called by the window once per frame
+        """
+        now = time.monotonic()
+        if self.last_time is not None and now-self.last_time<self.period:
+            return
+        try:
+            slot = self.free.get_nowait()
+        except queue.Empty:
+            # The encoder is behind
+            self.frames_dropped += 1
+            return
+        self.last_time = now
+        pixels, masks = screen_pixels(screen)
+        buffer = self.buffers[slot]
+        if buffer is None or buffer.shape != pixels.shape:
+            buffer = np.empty(pixels.shape, np.uint32)
+            self.buffers[slot] = buffer
+        np.copyto(buffer, pixels)
+        del pixels
+        if self.masks is None:
+            self.masks = masks
+        self.timestamps[slot] = time.time()
+        self.pending.put(slot)
+
+    @property
+    def stats(self):
+        """The frames recorded and dropped counters
+        """
+        return {"recorded":self.frames_recorded, "dropped":self.frames_dropped}
+
+    def _encode(self):
+        previous = None
+        header_written = False
+        while True:
+            slot = self.pending.get()
+            if slot is None:
+                return
+            frame = self.buffers[slot]
+            timestamp = self.timestamps[slot]
+            h, w = frame.shape
+            if self.format == "png":
+                surface = pygame.Surface((w, h), 0, 32, self.masks)
+                pygame.surfarray.blit_array(surface, frame.T)
+                pygame.image.save(surface, os.path.join(self.path, f"frame_{self.frames_recorded:06d}.png"))
+            else:
+                if not header_written:
+                    self.file.write(FILE_HEADER.pack(FILE_MAGIC, self.format.encode().ljust(4), *self.masks))
+                    header_written = True
+                if self.format == "raw":
+                    self.file.write(RAW_HEADER.pack(timestamp, w, h))
+                    self.file.write(frame.tobytes())
+                else:
+                    if previous is None or previous.shape != frame.shape:
+                        # Size change : a single run covering the frame
+                        starts = np.zeros(1, np.uint32)
+                        lengths = np.full(1, w*h, np.uint32)
+                        values = frame.ravel()
+                        previous = np.empty_like(frame)
+                    else:
+                        changed = (frame != previous).ravel()
+                        edges = np.flatnonzero(np.diff(np.concatenate(([False], changed, [False])).astype(np.int8)))
+                        starts = edges[::2].astype(np.uint32)
+                        lengths = (edges[1::2]-edges[::2]).astype(np.uint32)
+                        values = frame.ravel()[changed]
+                    self.file.write(RLE_HEADER.pack(timestamp, w, h, len(starts)))
+                    self.file.write(starts.tobytes())
+                    self.file.write(lengths.tobytes())
+                    self.file.write(values.tobytes())
+                    np.copyto(previous, frame)
+            self.frames_recorded += 1
+            self.free.put(slot)
+
+def read_recording(path:str):
+    """Reads a raw or rle recording
+
+    Args:
+        path (str): The recording file
+
+    Yields:
+        tuple: (timestamp, (height, width) uint32 pixels, (r, g, b, a) masks), the pixels array is reused for rle recordings
+    """
+    with open(path, "rb") as f:
+        magic, format, *masks = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+        if magic != FILE_MAGIC:
+            raise ValueError("Not a recording")
+        format = format.decode().strip()
+        frame = None
+        while True:
+            if format == "raw":
+                header = f.read(RAW_HEADER.size)
+                if len(header)<RAW_HEADER.size:
+                    return
+                timestamp, w, h = RAW_HEADER.unpack(header)
+                frame = np.frombuffer(f.read(w*h*4), np.uint32).reshape(h, w)
+            else:
+                header = f.read(RLE_HEADER.size)
+                if len(header)<RLE_HEADER.size:
+                    return
+                timestamp, w, h, count = RLE_HEADER.unpack(header)
+                starts = np.frombuffer(f.read(count*4), np.uint32)
+                lengths = np.frombuffer(f.read(count*4), np.uint32)
+                values = np.frombuffer(f.read(int(lengths.sum(dtype=np.int64))*4), np.uint32)
+                if frame is None or frame.shape != (h, w):
+                    frame = np.zeros((h, w), np.uint32)
+                flat = frame.ravel()
+                # Indices of the changed pixels, run by run
+                run_offsets = np.repeat(starts.astype(np.int64)-np.concatenate(([0], np.cumsum(lengths[:-1], dtype=np.int64))), lengths)
+                flat[np.arange(len(values))+run_offsets] = values
+            yield timestamp, frame, tuple(masks)
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""=== Face Analyzer Helpers =>
+    Module : replay
+    Author : Saifeddine ALOUI (ParisNeo)
+    Licence : MIT
+    Description :
+        Input events recording and deterministic replay
+        The events are stored with marshal, whose format may change between python versions :
+        logs are meant to be replayed by the python version that recorded them, others refuse them
+<================"""
+import time
+import struct
+import marshal
+
+import numpy as np
+import pygame
+
+# File : magic, version, marshal version, mouse position when the recording started
+FILE_HEADER = struct.Struct("<4sHHii")
+FILE_MAGIC = b"OOPI"
+FILE_VERSION = 2
+# Frame : time since the previous frame in seconds, size of the marshaled events (0 when there are none)
+FRAME_HEADER = struct.Struct("<fI")
+# Attribute types kept in the log
+_plain_types = (int, float, str, bool, tuple, bytes, type(None))
+
+class InputRecorder():
+    def __init__(self, path:str, source=pygame.event.get, clock=time.monotonic, mouse_pos:tuple=(-1, -1)):
+        """Records the events returned by an event source, one entry per frame with the time since the previous frame.
+        Events are stored as (type, attributes) lists marshaled in a compact binary log.
+
+        Args:
+            path (str): The log file
+            source (callable, optional): The recorded event source. Defaults to pygame.event.get.
+            clock (callable, optional): The clock giving the time in seconds. Defaults to time.monotonic.
+            mouse_pos (tuple, optional): The mouse position when the recording starts, restored before replaying. Defaults to (-1, -1).
+        """
+        self.source = source
+        self.clock = clock
+        self.file = open(path, "wb")
+        self.file.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION, marshal.version, int(mouse_pos[0]), int(mouse_pos[1])))
+        self.last_time = None
+        self.frames = 0
+
+    def get(self)->list:
+        """Returns the events of the source and logs them, used as the event source of the window
+        """
+        events = self.source()
+        now = self.clock()
+        dt = 0.0 if self.last_time is None else now-self.last_time
+        self.last_time = now
+        if len(events)>0:
+            payload = marshal.dumps([
+                (event.type, {name:value for name, value in event.dict.items() if isinstance(value, _plain_types)})
+                for event in events
+            ])
+        else:
+            payload = b""
+        self.file.write(FRAME_HEADER.pack(dt, len(payload)))
+        self.file.write(payload)
+        self.frames += 1
+        return events
+
+    def close(self):
+        self.file.close()
+
+class InputReplayer():
+    def __init__(self, path:str):
+        """Reads an input log written by InputRecorder
+
+        Args:
+            path (str): The log file
+        """
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, marshal_version, x, y = FILE_HEADER.unpack_from(data)
+        if magic != FILE_MAGIC or version != FILE_VERSION:
+            raise ValueError("Not an input log")
+        if marshal_version != marshal.version:
+            raise ValueError(f"The input log was recorded with marshal version {marshal_version}, this python uses {marshal.version}")
+        self.mouse_pos = (x, y)
+        self.frames = []
+        offset = FILE_HEADER.size
+        while offset+FRAME_HEADER.size<=len(data):
+            dt, size = FRAME_HEADER.unpack_from(data, offset)
+            offset += FRAME_HEADER.size
+            events = marshal.loads(data[offset:offset+size]) if size>0 else []
+            offset += size
+            self.frames.append((dt, events))
+        self.frame = 0
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def finished(self)->bool:
+        return self.frame>=len(self.frames)
+
+    @property
+    def dt(self)->float:
+        """The recorded duration of the next frame
+        """
+        return self.frames[self.frame][0]
+
+    def get(self)->list:
+        """Returns the events of the next frame, used as the event source of the window
+        """
+        # Keep the system event queue empty, real inputs are ignored during a replay
+        pygame.event.pump()
+        pygame.event.clear()
+        _, events = self.frames[self.frame]
+        self.frame += 1
+        return [pygame.event.Event(event_type, attributes) for event_type, attributes in events]
+
+class FixedStepClock():
+    def __init__(self, start:float=0.0):
+        """A clock only advancing when told to, gives the same times at each replay
+        """
+        self.time = start
+
+    def advance(self, dt:float):
+        self.time += dt
+
+    def __call__(self)->float:
+        return self.time
+
+def timing_summary(durations:np.ndarray)->dict:
+    """Summarizes per frame durations in seconds
+    """
+    ms = np.asarray(durations)*1000
+    return {
+        "frames":len(ms),
+        "total_s":float(ms.sum()/1000),
+        "mean_ms":float(ms.mean()) if len(ms) else 0.0,
+        "p50_ms":float(np.percentile(ms, 50)) if len(ms) else 0.0,
+        "p95_ms":float(np.percentile(ms, 95)) if len(ms) else 0.0,
+        "max_ms":float(ms.max()) if len(ms) else 0.0
+    }
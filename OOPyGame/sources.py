@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+"""=== Face Analyzer Helpers =>
+    Module : sources
+    Author : Saifeddine ALOUI (ParisNeo)
+    Licence : MIT
+    Description :
+        Streaming frame sources feeding ImageBox widgets
+<================"""
+import os
+import sys
+import time
+import queue
+import threading
+from abc import ABC, abstractmethod
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+# =============================================== Frame source ==========================================
+
+class FrameSource(ABC):
+    def __init__(self, fps:float=None, prefetch:int=8, speed:float=1.0, copy_frames:bool=False):
+        """Base class of frame sources.
+        A reader thread prefetches (timestamp, frame) pairs from the source into a bounded queue,
+        a player thread hands them to the sink when their timestamp is reached on the playback clock.
+        Frames that are late by more than one frame period are dropped.
+
+        Args:
+            fps (float, optional): The frame rate used to build timestamps when the source has none. Defaults to None (as fast as possible).
+            prefetch (int, optional): The number of frames read ahead. Defaults to 8.
+            speed (float, optional): The playback speed factor. Defaults to 1.0.
+            copy_frames (bool, optional): If True the sink has to copy the frames as the source reuses them. Defaults to False.
+        """
+        self.fps = fps
+        self.prefetch = prefetch
+        self.speed = speed
+        self.copy_frames = copy_frames
+        self.frames_read = 0
+        self.frames_played = 0
+        self.frames_late = 0
+        self.finished = False
+        self.threads = []
+        # Set to stop the threads, they wait on it instead of sleeping
+        self.stop_event = threading.Event()
+        self.stop_event.set()
+
+    @property
+    def running(self)->bool:
+        return not self.stop_event.is_set()
+
+    @abstractmethod
+    def frames(self):
+        """Yields the frames of the source as (timestamp in seconds or None, frame) pairs.
+        Called from the reader thread, it should return soon after running becomes False
+        """
+
+    def start(self, sink):
+        """Starts reading and playing the source
+
+        Args:
+            sink (callable): Called from the player thread as sink(frame, copy) for each frame, typically ImageBox.publishFrame
+        """
+        self.stop()
+        self.sink = sink
+        self.queue = queue.Queue(self.prefetch)
+        self.stop_event = threading.Event()
+        self.finished = False
+        # Each thread keeps its own stop event and queue, so threads of a previous run never resume
+        self.threads = [
+            threading.Thread(target=self._read, args=(self.stop_event, self.queue), daemon=True),
+            threading.Thread(target=self._play, args=(self.stop_event, self.queue), daemon=True)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self, timeout:float=1.0)->bool:
+        """Stops the reader and player threads, waiting at most timeout seconds for them.
+        A reader blocked inside the source is left behind (the threads are daemons) and stops at its next frame
+
+        Returns:
+            bool: True if all threads stopped in time
+        """
+        self.stop_event.set()
+        deadline = time.monotonic()+timeout
+        stopped = True
+        for thread in self.threads:
+            thread.join(max(0, deadline-time.monotonic()))
+            stopped = stopped and not thread.is_alive()
+        self.threads = []
+        return stopped
+
+    def _put(self, stop, frames_queue, item):
+        while not stop.is_set():
+            try:
+                frames_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _read(self, stop, frames_queue):
+        period = 1/self.fps if self.fps else None
+        try:
+            for i, (timestamp, frame) in enumerate(self.frames()):
+                if stop.is_set():
+                    return
+                if timestamp is None and period is not None:
+                    timestamp = i*period
+                self.frames_read += 1
+                if not self._put(stop, frames_queue, (timestamp, frame)):
+                    return
+        finally:
+            self._put(stop, frames_queue, None)
+
+    def _play(self, stop, frames_queue):
+        period = 1/self.fps if self.fps else 0
+        first_timestamp = None
+        while not stop.is_set():
+            try:
+                item = frames_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is None:
+                break
+            timestamp, frame = item
+            if timestamp is not None:
+                now = time.monotonic()
+                if first_timestamp is None:
+                    first_timestamp = timestamp
+                    start = now
+                due = start+(timestamp-first_timestamp)/self.speed
+                if now<due:
+                    if stop.wait(due-now):
+                        break
+                elif now-due>period and not frames_queue.empty():
+                    # Late and newer frames are waiting
+                    self.frames_late += 1
+                    continue
+            self.sink(frame, self.copy_frames)
+            self.frames_played += 1
+        if not stop.is_set():
+            self.finished = True
+
+# =============================================== Iterator source ==========================================
+
+class IteratorSource(FrameSource):
+    def __init__(self, iterable, fps:float=None, prefetch:int=8, speed:float=1.0, copy_frames:bool=True):
+        """A source reading frames from any iterable or generator.
+        Items are either frames or (timestamp, frame) pairs.
+
+        Args:
+            iterable (iterable): The frames
+            copy_frames (bool, optional): Set to False if the iterable yields a new array for each frame. Defaults to True.
+        """
+        super().__init__(fps, prefetch, speed, copy_frames)
+        self.iterable = iterable
+
+    def frames(self):
+        for item in self.iterable:
+            if not self.running:
+                return
+            if isinstance(item, tuple):
+                yield item
+            else:
+                yield None, item
+
+# =============================================== Files sources ==========================================
+
+class RawVideoSource(FrameSource):
+    def __init__(self, path:str, shape:tuple, dtype=np.uint8, fps:float=30, prefetch:int=8, speed:float=1.0, offset:int=0):
+        """A source reading a raw video file (frames stored one after the other) through memory mapping.
+        The prefetch thread pages the frames in ahead of playback
+
+        Args:
+            path (str): The path to the file
+            shape (tuple): The shape of a frame, for example (height, width, 3)
+            dtype (optional): The pixel type. Defaults to np.uint8.
+            fps (float, optional): The frame rate of the video. Defaults to 30.
+            offset (int, optional): The number of bytes to skip at the beginning of the file. Defaults to 0.
+        """
+        super().__init__(fps, prefetch, speed, False)
+        self.video = np.memmap(path, dtype=dtype, mode="r", offset=offset)
+        frame_size = int(np.prod(shape))
+        self.video = self.video[:len(self.video)//frame_size*frame_size].reshape((-1,)+tuple(shape))
+
+    def __len__(self):
+        return len(self.video)
+
+    def frames(self):
+        for frame in self.video:
+            if not self.running:
+                return
+            yield None, np.array(frame)
+
+class DirectorySource(FrameSource):
+    def __init__(self, path:str, fps:float=30, prefetch:int=8, speed:float=1.0):
+        """A source reading the .npy files of a directory in name order, each file holding one frame.
+        Files are memory mapped and paged in by the prefetch thread
+
+        Args:
+            path (str): The directory
+            fps (float, optional): The frame rate. Defaults to 30.
+        """
+        super().__init__(fps, prefetch, speed, False)
+        self.files = sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith(".npy"))
+
+    def __len__(self):
+        return len(self.files)
+
+    def frames(self):
+        for file in self.files:
+            if not self.running:
+                return
+            yield None, np.array(np.load(file, mmap_mode="r"))
+
+# =============================================== Shared memory ring ==========================================
+
+# Names of the blocks created by this process, they stay registered with its resource tracker
+_created_blocks = set()
+
+class SharedMemoryRing():
+    # Header : frames written count, then per slot (sequence number, timestamp)
+    header_items = 1
+
+    def __init__(self, shape:tuple, dtype=np.uint8, slots:int=4, name:str=None, create:bool=False):
+        """A ring buffer of frames in shared memory, written by one process and read by others.
+        Each slot carries a sequence number, it is set to -1 while the slot is being written so
+        readers can detect torn frames.
+
+        Args:
+            shape (tuple): The shape of a frame
+            dtype (optional): The pixel type. Defaults to np.uint8.
+            slots (int, optional): The number of frames in the ring. Defaults to 4.
+            name (str, optional): The name of the shared memory block. Defaults to None (a name is generated when creating).
+            create (bool, optional): True for the writer, that creates the block. Defaults to False.
+        """
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.slots = slots
+        self.owner = create
+        header_size = 8*(self.header_items+2*slots)
+        frame_size = int(np.prod(self.shape))*self.dtype.itemsize
+        if create or sys.version_info<(3, 13):
+            self.shm = shared_memory.SharedMemory(name=name, create=create, size=header_size+slots*frame_size)
+            if create:
+                _created_blocks.add(self.shm.name)
+            elif self.shm.name not in _created_blocks:
+                # Before python 3.13 attaching registers the block with the resource tracker of the reader,
+                # which would unlink the writer's block when the reader exits
+                resource_tracker.unregister(self.shm._name, "shared_memory")
+        else:
+            self.shm = shared_memory.SharedMemory(name=name, size=header_size+slots*frame_size, track=False)
+        self.name = self.shm.name
+        self.count = np.ndarray((1,), np.int64, self.shm.buf, 0)
+        self.meta = np.ndarray((slots, 2), np.float64, self.shm.buf, 8*self.header_items)
+        self.frames = np.ndarray((slots,)+self.shape, self.dtype, self.shm.buf, header_size)
+        if create:
+            self.count[0] = 0
+            self.meta[:] = -1
+
+    def write(self, frame:np.ndarray, timestamp:float=None):
+        """Writes a frame in the next slot (writer side)
+        """
+        n = int(self.count[0])
+        slot = n%self.slots
+        self.meta[slot, 0] = -1
+        self.frames[slot] = frame
+        self.meta[slot, 1] = time.time() if timestamp is None else timestamp
+        self.meta[slot, 0] = n
+        self.count[0] = n+1
+
+    def read(self, n:int):
+        """Reads a copy of frame number n, returns (timestamp, frame) or None if it was overwritten (reader side)
+        """
+        slot = n%self.slots
+        if self.meta[slot, 0] != n:
+            return None
+        timestamp = float(self.meta[slot, 1])
+        frame = self.frames[slot].copy()
+        if self.meta[slot, 0] != n:
+            return None
+        return timestamp, frame
+
+    def __del__(self):
+        # SharedMemory alone would close the block while the views on it still exist
+        if hasattr(self, "frames"):
+            self.close(self.owner)
+
+    def close(self, unlink:bool=False):
+        # Views on the buffer must be released before closing it
+        del self.count, self.meta, self.frames
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+            _created_blocks.discard(self.shm.name)
+
+class SharedMemorySource(FrameSource):
+    def __init__(self, name:str, shape:tuple, dtype=np.uint8, slots:int=4, prefetch:int=4, poll_interval_s:float=0.001, pace:bool=False):
+        """A source reading the frames written by another process in a SharedMemoryRing.
+        When the reader falls more than a ring behind, the overwritten frames are skipped.
+
+        Args:
+            name (str): The name of the shared memory block
+            shape (tuple): The shape of a frame
+            dtype (optional): The pixel type. Defaults to np.uint8.
+            slots (int, optional): The number of frames in the ring. Defaults to 4.
+            poll_interval_s (float, optional): The delay between two checks for new frames. Defaults to 0.001.
+            pace (bool, optional): If True frames are played at the pace of their timestamps, otherwise as soon as they arrive. Defaults to False.
+        """
+        super().__init__(None, prefetch, 1.0, False)
+        self.ring = SharedMemoryRing(shape, dtype, slots, name)
+        self.poll_interval_s = poll_interval_s
+        self.pace = pace
+        self.frames_skipped = 0
+
+    def frames(self):
+        n = int(self.ring.count[0])
+        while self.running:
+            count = int(self.ring.count[0])
+            if n>=count:
+                self.stop_event.wait(self.poll_interval_s)
+                continue
+            if count-n>self.ring.slots:
+                self.frames_skipped += count-self.ring.slots-n
+                n = count-self.ring.slots
+            item = self.ring.read(n)
+            n += 1
+            if item is None:
+                self.frames_skipped += 1
+                continue
+            timestamp, frame = item
+            yield (timestamp if self.pace else None), frame
+
+    def close(self):
+        self.stop()
+        self.ring.close()
@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+"""=== Face Analyzer Helpers =>
+    Module : streaming
+    Author : Saifeddine ALOUI (ParisNeo)
+    Licence : MIT
+    Description :
+        Delta encoded streaming of a window to remote viewers over a TCP or Unix socket
+<================"""
+import os
+import json
+import queue
+import socket
+import struct
+import zlib
+import threading
+import selectors
+
+import numpy as np
+import pygame
+
+from OOPyGame import FrameSlot
+
+# Frame message : magic, frame number, keyframe flag, width, height, red/green/blue/alpha masks, rectangles count
+# followed by the rectangles : x, y, width, height, compressed size, zlib compressed 32 bits pixels (row major)
+FRAME_HEADER = struct.Struct("<4sIBHHIIIIH")
+RECT_HEADER = struct.Struct("<HHHHI")
+FRAME_MAGIC = b"OOPF"
+# Event message : magic, size, json {"type":event type, "dict":event attributes}
+EVENT_HEADER = struct.Struct("<4sI")
+EVENT_MAGIC = b"OOPE"
+
+def screen_pixels(screen:pygame.Surface):
+    """Returns the pixels of a surface as a (height, width) uint32 array and their (r, g, b, a) masks
+    """
+    w, h = screen.get_size()
+    if screen.get_bitsize() == 32:
+        pixels = np.frombuffer(screen.get_buffer(), np.uint32).reshape(h, screen.get_pitch()//4)[:, :w]
+        return pixels, screen.get_masks()
+    pixels = np.frombuffer(pygame.image.tostring(screen, "RGBX"), np.uint32).reshape(h, w)
+    return pixels, (0xff, 0xff00, 0xff0000, 0)
+
+def changed_rects(previous:np.ndarray, current:np.ndarray, tile_size:int=32)->list:
+    """Compares two frames tile by tile and returns the changed area as rectangles.
+    Changed tiles of a tile row are merged into spans, identical spans of consecutive rows into rectangles.
+
+    Args:
+        previous (np.ndarray): The previous (height, width) frame
+        current (np.ndarray): The current frame
+        tile_size (int, optional): The size of the tiles. Defaults to 32.
+
+    Returns:
+        list: The changed (x, y, width, height) rectangles
+    """
+    h, w = current.shape
+    changed = previous != current
+    tiles = np.logical_or.reduceat(np.logical_or.reduceat(changed, np.arange(0, h, tile_size), axis=0), np.arange(0, w, tile_size), axis=1)
+    rects = []
+    # Spans of the previous tile row, (first tile, last tile) -> index in rects
+    open_spans = {}
+    for ty, row in enumerate(tiles):
+        spans = {}
+        edges = np.flatnonzero(np.diff(np.concatenate(([False], row, [False])).astype(np.int8)))
+        for start, stop in zip(edges[::2], edges[1::2]):
+            y = ty*tile_size
+            if (start, stop) in open_spans:
+                index = open_spans[(start, stop)]
+                rects[index][3] = min(y+tile_size, h)-rects[index][1]
+            else:
+                index = len(rects)
+                rects.append([start*tile_size, y, min(stop*tile_size, w)-start*tile_size, min(y+tile_size, h)-y])
+            spans[(start, stop)] = index
+        open_spans = spans
+    return [tuple(int(v) for v in rect) for rect in rects]
+
+def encode_frame(number:int, frame:np.ndarray, masks:tuple, rects:list, keyframe:bool, level:int=1)->bytes:
+    """Encodes the rectangles of a frame into a frame message
+    """
+    h, w = frame.shape
+    parts = [FRAME_HEADER.pack(FRAME_MAGIC, number, keyframe, w, h, *masks, len(rects))]
+    for x, y, rw, rh in rects:
+        data = zlib.compress(np.ascontiguousarray(frame[y:y+rh, x:x+rw]).tobytes(), level)
+        parts.append(RECT_HEADER.pack(x, y, rw, rh, len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+def encode_event(event:pygame.event.Event)->bytes:
+    """Encodes an input event into an event message
+    """
+    attributes = {name:value for name, value in event.dict.items() if isinstance(value, (int, float, str, bool, tuple, list)) or value is None}
+    payload = json.dumps({"type":event.type, "dict":attributes}).encode("utf-8")
+    return EVENT_HEADER.pack(EVENT_MAGIC, len(payload))+payload
+
+def decode_event(payload:bytes)->pygame.event.Event:
+    message = json.loads(payload.decode("utf-8"))
+    attributes = {name:tuple(value) if isinstance(value, list) else value for name, value in message["dict"].items()}
+    return pygame.event.Event(message["type"], attributes)
+
+def _receive(sock:socket.socket, size:int)->bytes:
+    data = bytearray()
+    while len(data)<size:
+        chunk = sock.recv(size-len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed")
+        data += chunk
+    return bytes(data)
+
+def _create_socket(address):
+    if isinstance(address, str):
+        return socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    return socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+# =============================================== Server ==========================================
+
+class FrameStreamServer():
+    def __init__(self, address=("127.0.0.1", 5900), keyframe_interval:int=120, tile_size:int=32, compression_level:int=1, send_timeout_s:float=2.0):
+        """Streams the frames of a window to the connected viewers and collects their input events.
+        The window only copies its pixels in a latest-frame-wins slot, a sender thread compares the frame with the
+        last sent one tile by tile and sends the changed rectangles zlib compressed. New viewers and every
+        keyframe_interval frames get a keyframe. Frames produced while the previous one is being sent are dropped,
+        the next delta still covers their changes.
+
+        Args:
+            address (tuple or str, optional): A (host, port) pair for TCP or a path for a Unix socket. Defaults to ("127.0.0.1", 5900).
+            keyframe_interval (int, optional): The number of sent frames between two keyframes. Defaults to 120.
+            tile_size (int, optional): The size of the compared tiles. Defaults to 32.
+            compression_level (int, optional): The zlib level, 1 is the fastest. Defaults to 1.
+            send_timeout_s (float, optional): Viewers not accepting a frame within this delay are disconnected. Defaults to 2.0.
+        """
+        self.address = address
+        self.keyframe_interval = keyframe_interval
+        self.tile_size = tile_size
+        self.compression_level = compression_level
+        self.send_timeout_s = send_timeout_s
+        self.slot = FrameSlot()
+        self.new_frame = threading.Event()
+        self.events = queue.Queue()
+        self.clients = {}
+        self.clients_lock = threading.Lock()
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.running = False
+        self.threads = []
+
+    def start(self):
+        """Starts listening
+        """
+        self.listener = _create_socket(self.address)
+        if not isinstance(self.address, str):
+            self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind(self.address)
+        self.listener.listen()
+        self.listener.setblocking(False)
+        if not isinstance(self.address, str):
+            # The actual port when 0 was asked
+            self.address = self.listener.getsockname()
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.listener, selectors.EVENT_READ)
+        self.running = True
+        self.threads = [
+            threading.Thread(target=self._serve, daemon=True),
+            threading.Thread(target=self._send, daemon=True)
+        ]
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        """Disconnects the viewers and stops listening
+        """
+        self.running = False
+        self.new_frame.set()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        with self.clients_lock:
+            for client in list(self.clients):
+                client.close()
+            self.clients.clear()
+        self.selector.close()
+        self.listener.close()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+
+    def publish(self, screen:pygame.Surface):
+        """Copies the pixels of the screen for the sender thread, called by the window once per frame
+        """
+        if len(self.clients) == 0:
+            return
+        pixels, masks = screen_pixels(screen)
+        self.masks = masks
+        self.slot.publish(pixels, True)
+        del pixels
+        self.new_frame.set()
+
+    def poll_events(self)->list:
+        """Returns the input events received from the viewers since the last call
+        """
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def _serve(self):
+        while self.running:
+            for key, _ in self.selector.select(0.1):
+                if key.fileobj is self.listener:
+                    try:
+                        client, _ = self.listener.accept()
+                    except OSError:
+                        continue
+                    client.settimeout(self.send_timeout_s)
+                    with self.clients_lock:
+                        # The first frame sent to a viewer is a keyframe
+                        self.clients[client] = {"keyframe":True, "buffer":b""}
+                    self.selector.register(client, selectors.EVENT_READ)
+                else:
+                    self._read(key.fileobj)
+
+    def _read(self, client:socket.socket):
+        try:
+            data = client.recv(65536)
+        except OSError:
+            data = b""
+        with self.clients_lock:
+            state = self.clients.get(client)
+        if not data or state is None:
+            self._drop(client)
+            return
+        buffer = state["buffer"]+data
+        while len(buffer)>=EVENT_HEADER.size:
+            magic, size = EVENT_HEADER.unpack_from(buffer)
+            if magic != EVENT_MAGIC:
+                self._drop(client)
+                return
+            if len(buffer)<EVENT_HEADER.size+size:
+                break
+            self.events.put(decode_event(buffer[EVENT_HEADER.size:EVENT_HEADER.size+size]))
+            buffer = buffer[EVENT_HEADER.size+size:]
+        state["buffer"] = buffer
+
+    def _drop(self, client:socket.socket):
+        with self.clients_lock:
+            if self.clients.pop(client, None) is None:
+                return
+        try:
+            self.selector.unregister(client)
+        except (KeyError, ValueError):
+            pass
+        client.close()
+
+    def _send(self):
+        previous = None
+        since_keyframe = 0
+        while self.running:
+            self.new_frame.wait(0.1)
+            self.new_frame.clear()
+            frame = self.slot.take()
+            if frame is None or not self.running:
+                continue
+            with self.clients_lock:
+                clients = list(self.clients.items())
+            if len(clients) == 0:
+                continue
+            h, w = frame.shape
+            keyframe = previous is None or previous.shape != frame.shape or since_keyframe>=self.keyframe_interval
+            key_message = None
+            delta_message = None
+            if not keyframe:
+                rects = changed_rects(previous, frame, self.tile_size)
+                delta_message = encode_frame(self.frames_sent, frame, self.masks, rects, False, self.compression_level)
+            if keyframe or any(state["keyframe"] for _, state in clients):
+                key_message = encode_frame(self.frames_sent, frame, self.masks, [(0, 0, w, h)], True, self.compression_level)
+            for client, state in clients:
+                message = key_message if keyframe or state["keyframe"] else delta_message
+                try:
+                    client.sendall(message)
+                    state["keyframe"] = False
+                    self.bytes_sent += len(message)
+                except OSError:
+                    self._drop(client)
+            since_keyframe = 0 if keyframe else since_keyframe+1
+            if previous is None or previous.shape != frame.shape:
+                previous = np.empty_like(frame)
+            np.copyto(previous, frame)
+            self.frames_sent += 1
+
+# =============================================== Client ==========================================
+
+class FrameStreamClient():
+    def __init__(self, address=("127.0.0.1", 5900), timeout_s:float=5.0):
+        """A viewer of a FrameStreamServer : applies the received frames to a local copy of the window pixels
+        and sends input events back
+
+        Args:
+            address (tuple or str, optional): A (host, port) pair for TCP or a path for a Unix socket. Defaults to ("127.0.0.1", 5900).
+            timeout_s (float, optional): The connection and reception timeout. Defaults to 5.0.
+        """
+        self.sock = _create_socket(address)
+        self.sock.settimeout(timeout_s)
+        self.sock.connect(address)
+        self.frame = None
+        self.masks = None
+        self.number = None
+        self.keyframe = False
+        self.rects = []
+
+    def receive(self)->np.ndarray:
+        """Receives the next frame message and applies it
+
+        Returns:
+            np.ndarray: The (height, width) uint32 pixels of the window
+        """
+        magic, number, keyframe, w, h, rm, gm, bm, am, count = FRAME_HEADER.unpack(_receive(self.sock, FRAME_HEADER.size))
+        if magic != FRAME_MAGIC:
+            raise ValueError("Not a frame stream")
+        if self.frame is None or self.frame.shape != (h, w):
+            self.frame = np.zeros((h, w), np.uint32)
+        self.rects = []
+        for _ in range(count):
+            x, y, rw, rh, size = RECT_HEADER.unpack(_receive(self.sock, RECT_HEADER.size))
+            pixels = np.frombuffer(zlib.decompress(_receive(self.sock, size)), np.uint32)
+            self.frame[y:y+rh, x:x+rw] = pixels.reshape(rh, rw)
+            self.rects.append((x, y, rw, rh))
+        self.number = number
+        self.keyframe = bool(keyframe)
+        self.masks = (rm, gm, bm, am)
+        return self.frame
+
+    def surface(self)->pygame.Surface:
+        """Returns the received window as a surface
+        """
+        h, w = self.frame.shape
+        surface = pygame.Surface((w, h), 0, 32, self.masks)
+        pygame.surfarray.blit_array(surface, self.frame.T)
+        return surface
+
+    def sendEvent(self, event:pygame.event.Event):
+        """Sends an input event to the window (positions are window coordinates)
+        """
+        self.sock.sendall(encode_event(event))
+
+    def close(self):
+        self.sock.close()
+
+def view(address, fps:float=60):
+    """Reference viewer : shows the streamed window and forwards the mouse and keyboard events
+    """
+    pygame.init()
+    client = FrameStreamClient(address)
+    client.receive()
+    h, w = client.frame.shape
+    screen = pygame.display.set_mode((w, h))
+    pygame.display.set_caption(f"OOPyGame stream {address}")
+    forwarded = (pygame.MOUSEMOTION, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP, pygame.MOUSEWHEEL, pygame.KEYDOWN, pygame.KEYUP, pygame.TEXTINPUT)
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type in forwarded:
+                client.sendEvent(event)
+        frame = client.receive()
+        if frame.shape != (h, w):
+            h, w = frame.shape
+            screen = pygame.display.set_mode((w, h))
+        screen.blit(client.surface(), (0, 0))
+        pygame.display.update()
+    client.close()
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Views a window streamed with WindowManager.stream")
+    parser.add_argument("address", help="host:port or the path of a Unix socket")
+    args = parser.parse_args()
+    if ":" in args.address:
+        host, port = args.address.rsplit(":", 1)
+        view((host, int(port)))
+    else:
+        view(args.address)
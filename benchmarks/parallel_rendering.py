@@ -0,0 +1,108 @@
+"""Compares single threaded painting with the experimental tile parallel painting (WindowManager.setRenderThreads)
+
+Usage : python benchmarks/parallel_rendering.py [--frames 200] [--threads 1 4 8] [--grid 4] [--check]
+Set SDL_VIDEODRIVER=dummy to run it without a window.
+--check only paints a window of the stock widgets on several threads and fails if the parallel painting
+is not used or raises, it is the smoke test of WindowManager.paint_parallel.
+Parallel frames are not pixel identical to serial ones : each widget is clipped to its rectangle.
+On a single core machine several threads were measured slower than one (0.79x to 0.91x), see the README for the results.
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pygame
+
+from OOPyGame import WindowManager, HorizontalLayout, VerticalLayout, ImageBox, Label, Button, TextBox, ProgressBar, Slider, List, Table
+
+def build_window(grid:int):
+    window = WindowManager("Parallel rendering benchmark", (1280, 720))
+    rows = VerticalLayout()
+    image_boxes = []
+    for _ in range(grid):
+        row = HorizontalLayout()
+        for _ in range(grid):
+            cell = VerticalLayout()
+            image_box = ImageBox()
+            image_boxes.append(image_box)
+            cell.addWidget(image_box, 0.8)
+            cell.addWidget(Label("Camera"), 0.1)
+            cell.addWidget(Button("Select"), 0.1)
+            row.addWidget(cell)
+        rows.addWidget(row)
+    window.addWidget(rows)
+    return window, image_boxes
+
+def build_stock_window():
+    window = WindowManager("Parallel rendering check", (800, 600))
+    columns = VerticalLayout()
+    controls = HorizontalLayout()
+    controls.addWidget(Label("Label"))
+    controls.addWidget(TextBox("Text box"))
+    controls.addWidget(Button("Button"))
+    columns.addWidget(controls, 0.1)
+    # Identical widgets paint from the same cached surfaces at the same time
+    buttons = HorizontalLayout()
+    for i in range(8):
+        buttons.addWidget(Button("Select"))
+    columns.addWidget(buttons, 0.1)
+    progress = ProgressBar(style="brogressbar.outer{background-color:#ffffff;border-radius:6;}\nbrogressbar.inner{background-color:#3a7bd5;border-radius:6;}")
+    columns.addWidget(progress, 0.1)
+    slider = Slider()
+    columns.addWidget(slider, 0.1)
+    lists = HorizontalLayout()
+    lists.addWidget(List(list=[f"Item {i}" for i in range(20)]))
+    lists.addWidget(Table(columns={"index":np.arange(1000), "square":np.arange(1000)**2}))
+    image_box = ImageBox()
+    lists.addWidget(image_box)
+    columns.addWidget(lists, 0.6)
+    window.addWidget(columns)
+    return window, progress, slider, image_box
+
+def check(frames:int, threads:int):
+    window, progress, slider, image_box = build_stock_window()
+    window.setRenderThreads(threads)
+    image = np.random.randint(0, 255, (240, 320, 3), np.uint8)
+    for i in range(frames):
+        progress.value = i/frames
+        slider.setValue(1-i/frames)
+        image_box.publishFrame(image, False)
+        window.process()
+    if not window.paint_parallel():
+        raise RuntimeError("The display format does not allow parallel painting")
+    window.setRenderThreads(1)
+    print(f"Parallel painting check passed : {frames} frames on {threads} threads")
+
+def run(window, image_boxes, frames:list, count:int)->float:
+    start = time.perf_counter()
+    for i in range(count):
+        for j, image_box in enumerate(image_boxes):
+            # A new frame per box and per frame, scaled to the box when painted
+            image_box.publishFrame(frames[(i+j)%len(frames)], False)
+        window.process()
+    return count/(time.perf_counter()-start)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--grid", type=int, default=4)
+    parser.add_argument("--check", action="store_true")
+    args = parser.parse_args()
+
+    pygame.init()
+    if args.check:
+        check(args.frames, max(args.threads))
+        raise SystemExit(0)
+    print(f"{os.cpu_count()} cores")
+    window, image_boxes = build_window(args.grid)
+    frames = [np.random.randint(0, 255, (720, 1280, 3), np.uint8) for _ in range(4)]
+    run(window, image_boxes, frames, 10)
+    reference = None
+    for threads in args.threads:
+        window.setRenderThreads(threads)
+        fps = run(window, image_boxes, frames, args.frames)
+        reference = reference or fps
+        print(f"{threads} thread(s) : {fps:7.1f} frames/s ({fps/reference:.2f}x)")
+    window.setRenderThreads(1)
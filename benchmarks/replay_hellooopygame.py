@@ -0,0 +1,71 @@
+"""Replays an input log on the Hellooopygame scene and prints per frame timings, so that the same interaction
+gives comparable numbers across commits.
+
+Usage :
+    python benchmarks/replay_hellooopygame.py record session.oopin       (interact, close the window to stop)
+    python benchmarks/replay_hellooopygame.py script session.oopin       (writes a scripted interaction)
+    python benchmarks/replay_hellooopygame.py replay session.oopin [--fixed-dt 0.016] [--timings timings.csv]
+Replays run headless unless SDL_VIDEODRIVER is set.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "examples", "Hellooopygame"))
+
+import pygame
+
+def scripted_frames():
+    """A list of per frame events : hovering and scrolling the list, dragging the slider, clicking the button and typing"""
+    frames = []
+    for i in range(60):
+        frames.append([pygame.event.Event(pygame.MOUSEMOTION, pos=(80, 40+i*8), rel=(0, 8), buttons=(0, 0, 0))])
+    for i in range(30):
+        frames.append([pygame.event.Event(pygame.MOUSEWHEEL, x=0, y=-1 if i<15 else 1, flipped=False, precise_x=0.0, precise_y=0.0)])
+    frames.append([pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=(200, 440), button=1)])
+    for i in range(60):
+        frames.append([pygame.event.Event(pygame.MOUSEMOTION, pos=(200+i*9, 440), rel=(9, 0), buttons=(1, 0, 0))])
+    frames.append([pygame.event.Event(pygame.MOUSEBUTTONUP, pos=(740, 440), button=1)])
+    frames.append([pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=(300, 470), button=1)])
+    frames.append([pygame.event.Event(pygame.MOUSEBUTTONUP, pos=(300, 470), button=1)])
+    frames.append([pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=(500, 560), button=1)])
+    frames.append([pygame.event.Event(pygame.MOUSEBUTTONUP, pos=(500, 560), button=1)])
+    for c in "hello oopygame":
+        frames.append([pygame.event.Event(pygame.KEYDOWN, key=ord(c), mod=0, unicode=c, scancode=0)])
+        frames.append([pygame.event.Event(pygame.KEYUP, key=ord(c), mod=0, unicode=c, scancode=0)])
+    frames += [[] for _ in range(60)]
+    return frames
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("mode", choices=["record", "script", "replay"])
+    parser.add_argument("log")
+    parser.add_argument("--fixed-dt", type=float, default=1/60, help="Clock step per replayed frame, 0 to use the recorded steps")
+    parser.add_argument("--timings", help="Csv file receiving the duration of each frame")
+    args = parser.parse_args()
+
+    if args.mode == "script":
+        from OOPyGame.replay import InputRecorder, FixedStepClock
+        frames = iter(scripted_frames())
+        clock = FixedStepClock()
+        recorder = InputRecorder(args.log, lambda: next(frames), clock)
+        for _ in range(len(scripted_frames())):
+            clock.advance(1/60)
+            recorder.get()
+        recorder.close()
+        print(f"{recorder.frames} frames written to {args.log}")
+        sys.exit(0)
+
+    if args.mode == "replay":
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    from main import MainWindow
+    pygame.init()
+    window = MainWindow()
+    if args.mode == "record":
+        recorder = window.recordInput(args.log)
+        window.loop()
+        window.stopInputRecording(recorder)
+        print(f"{recorder.frames} frames recorded to {args.log}")
+    else:
+        summary = window.replayInput(args.log, args.fixed_dt or None, args.timings)
+        print(" ".join(f"{name}={value:.3f}" if isinstance(value, float) else f"{name}={value}" for name, value in summary.items()))
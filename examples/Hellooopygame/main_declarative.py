@@ -0,0 +1,38 @@
+from OOPyGame import WindowManager
+from OOPyGame.loader import load_ui
+from pathlib import Path
+import pygame
+# ===== Build pygame window and populate with widgets from main_ui.json ===
+pygame.init()
+class MainWindow(WindowManager):
+    def __init__(self):
+        # Initialize the window manager
+        WindowManager.__init__(self, "Face box", (800,600))
+        # Widgets with an id become attributes of the window (self.time_slider...)
+        # the compiled plan is cached in main_ui.uiplan
+        load_ui(str(Path(__file__).parent/"main_ui.json"), self)
+
+        # Build a timer that repeats every 1/24 secondes
+        self.timer = self.build_timer(self.do_stuf,1/24)
+        self.timer.start()
+
+    def slider_mouse_down(self):
+        # when the slider is pressed with mouse this callback is triggered
+        pass
+
+    def slider_updated(self, val):
+        # When slider value changed this callback is triggered
+        pass
+
+    def do_stuf(self):
+        # Here do something that will be executed every timer tick
+        pass
+
+    def fn_quit(self):
+        self.Running=False
+
+# =======================================================================
+
+if __name__=="__main__":
+    mw = MainWindow()
+    mw.loop()